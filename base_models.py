@@ -12,11 +12,11 @@ class MusicBaseModel(BaseModel):
     style: str = Field(..., description="Music style")
     title: str = Field(..., description="Song title")
     instrumental: bool = Field(..., description="Is it instrumental?")
-    negative_tags: str = Field(default="", description="Unwanted characteristics")
-    vocal_gender: Literal["f", "m"] = Field(..., description="Vocal gender")
-    style_weight: float = Field(default=0.65, ge=0, le=1)
-    weirdness_constraint: float = Field(default=0.65, ge=0, le=1)
-    audio_weight: float = Field(default=0.65, ge=0, le=1)
+    negative_tags: str = Field(default="", description="Unwanted characteristics", serialization_alias="negativeTags")
+    vocal_gender: Literal["f", "m"] = Field(..., description="Vocal gender", serialization_alias="vocalGender")
+    style_weight: float = Field(default=0.65, ge=0, le=1, serialization_alias="styleWeight")
+    weirdness_constraint: float = Field(default=0.65, ge=0, le=1, serialization_alias="weirdnessConstraint")
+    audio_weight: float = Field(default=0.65, ge=0, le=1, serialization_alias="audioWeight")
 
 
 class MusicGenerationAgentBaseModel(BaseModel):
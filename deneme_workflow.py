@@ -5,12 +5,51 @@ Receives messages from WhatsApp and forwards them to System Supervisor.
 """
 
 import os
+import atexit
+import asyncio
+import logging
+import logging.handlers
+import queue
+import time
 import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from flask import Flask, request, jsonify, send_from_directory
 from langgraph.types import Command
 from system_supervisor import create_system_supervisor
 from state import create_initial_state
+from suno_ai import notify_task_update
+
+# SQLite checkpointer is optional - without it conversations live in memory
+try:
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    SQLITE_CHECKPOINT_AVAILABLE = True
+except ImportError:
+    SQLITE_CHECKPOINT_AVAILABLE = False
+
+# S3 upload is optional - without it links point at this server's /files routes
+try:
+    import boto3
+    S3_AVAILABLE = True
+except ImportError:
+    S3_AVAILABLE = False
+
+# Request and workflow threads only enqueue log records; a listener thread
+# does the actual stream writes
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_log_queue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+_queue_handler = logging.handlers.QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter("%(message)s"))  # final format is applied by _log_handler
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), handlers=[_queue_handler])
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
@@ -19,11 +58,35 @@ ARTIFACTS_DIR = os.path.abspath("artifacts")
 os.makedirs(f"{ARTIFACTS_DIR}/musics", exist_ok=True)
 os.makedirs(f"{ARTIFACTS_DIR}/generated_images", exist_ok=True)
 os.makedirs(f"{ARTIFACTS_DIR}/final_videos", exist_ok=True)
+os.makedirs(f"{ARTIFACTS_DIR}/databases", exist_ok=True)
+
+# Interrupted conversations (waiting for a reply or a track pick) survive restarts
+CHECKPOINT_DB = f"{ARTIFACTS_DIR}/databases/checkpoints.db"
+
+# When runs write checkpoints: "exit" only when a run stops (interrupt, finish or
+# error) - the only points a conversation is resumed from; "async"/"sync" after every node
+WORKFLOW_DURABILITY = os.getenv("WORKFLOW_DURABILITY", "exit")
 
 # Server info (for Tailscale)
 SERVER_HOST = os.getenv("SERVER_HOST", "100.x.x.x")  # Tailscale IP
 SERVER_PORT = os.getenv("SERVER_PORT", "5000")
 
+# Object storage for generated files (links keep working when this server isn't reachable)
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_PUBLIC_URL = os.getenv("S3_PUBLIC_URL")  # e.g. CloudFront domain; presigned links when unset
+S3_URL_EXPIRES = int(os.getenv("S3_URL_EXPIRES", str(7 * 24 * 3600)))
+
+# Uploaded files' links, reused for half the presign lifetime so a reused link
+# still has at least that long to live (fallback server links are not kept)
+S3_URL_CACHE_TTL = S3_URL_EXPIRES / 2
+S3_URL_CACHE_SIZE = 512
+s3_urls = OrderedDict()  # file_path -> (url, reuse deadline), oldest first
+s3_urls_lock = threading.Lock()
+
+# Phones with a workflow run in progress (its checkpoint is written only when the run stops)
+running_threads = set()
+running_threads_lock = threading.Lock()
+
 # ============== DUPLICATE MESSAGE CHECK ==============
 # Keep last processed messages (phone -> {message_id, hash, timestamp})
 processed_messages = {}
@@ -81,11 +144,32 @@ def is_duplicate_message(phone: str, text: str, message_id: str = None) -> bool:
     return False
 
 
+# Every workflow run happens on one long-lived event loop, so concurrent
+# conversations share the async HTTP pools and LLM calls overlap
+workflow_loop = asyncio.new_event_loop()
+threading.Thread(target=workflow_loop.run_forever, name="workflow-loop", daemon=True).start()
+
+
+def run_workflow(coro):
+    """Runs a workflow coroutine on the shared loop and waits for the result"""
+    return asyncio.run_coroutine_threadsafe(coro, workflow_loop).result()
+
+
+async def open_checkpointer():
+    """SQLite checkpointer bound to the workflow loop"""
+    conn = await aiosqlite.connect(CHECKPOINT_DB)
+    # The saver switches the file to WAL; in WAL mode NORMAL sync is still
+    # crash-safe and skips an fsync on every checkpoint write
+    await conn.execute("PRAGMA synchronous=NORMAL")
+    return AsyncSqliteSaver(conn)
+
+
 # Start Supervisor
 print("Starting System Supervisor...")
-supervisor = create_system_supervisor()
+checkpointer = run_workflow(open_checkpointer()) if SQLITE_CHECKPOINT_AVAILABLE else None
+supervisor = create_system_supervisor(checkpointer)
 workflow = supervisor.workflow
-print("System Supervisor ready!")
+logger.info("System Supervisor ready (checkpoints: %s)", CHECKPOINT_DB if checkpointer else "in memory")
 
 
 # ============== STATIC FILE ROUTES ==============
@@ -123,8 +207,62 @@ def get_file_url(file_path: str) -> str:
         return None
 
 
-# Give URL function to Supervisor
-supervisor.get_file_url = get_file_url
+s3_client = boto3.client("s3") if S3_AVAILABLE and S3_BUCKET else None
+
+
+def get_s3_file_url(file_path: str) -> str:
+    """Upload file to S3 and return its link (server link if the upload fails)"""
+    if not file_path:
+        return None
+    
+    now = time.monotonic()
+    with s3_urls_lock:
+        cached = s3_urls.get(file_path)
+        if cached and cached[1] > now:
+            return cached[0]
+    
+    key = f"{os.path.basename(os.path.dirname(file_path))}/{os.path.basename(file_path)}"
+    
+    try:
+        s3_client.upload_file(
+            file_path,
+            S3_BUCKET,
+            key,
+            ExtraArgs={
+                "ContentType": mimetypes.guess_type(file_path)[0] or "application/octet-stream",
+                "CacheControl": "public, max-age=31536000"
+            }
+        )
+    except Exception as e:
+        logger.warning("S3 upload error (%s): %s", key, e)
+        return get_file_url(file_path)
+    
+    if S3_PUBLIC_URL:
+        url = f"{S3_PUBLIC_URL.rstrip('/')}/{key}"
+    else:
+        url = s3_client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": S3_BUCKET, "Key": key},
+            ExpiresIn=S3_URL_EXPIRES
+        )
+    
+    with s3_urls_lock:
+        s3_urls.pop(file_path, None)
+        s3_urls[file_path] = (url, now + S3_URL_CACHE_TTL)
+        if len(s3_urls) > S3_URL_CACHE_SIZE:
+            s3_urls.popitem(last=False)
+    return url
+
+
+# Give URL function to Supervisor (S3 links are reused, so a file is uploaded once per S3_URL_CACHE_TTL)
+supervisor.get_file_url = get_s3_file_url if s3_client else get_file_url
+
+# Let media uploads started by send_music/send_video finish on shutdown
+atexit.register(lambda: run_workflow(supervisor.wait_background_tasks()))
+
+# Keep remembered music parameters for the next start
+if supervisor.music_param_store is not None:
+    atexit.register(supervisor.music_param_store.save)
 
 
 @app.route('/webhook', methods=['POST'])
@@ -156,6 +294,23 @@ def webhook():
     # Use phone number as thread ID
     config = {"configurable": {"thread_id": phone}}
     
+    # One run per conversation at a time; later messages wait for the next interrupt
+    with running_threads_lock:
+        already_running = phone in running_threads
+        running_threads.add(phone)
+    
+    if already_running:
+        logger.info("Workflow already running for %s, user message put on hold", phone)
+        try:
+            supervisor.message_helper.send_message(
+                phone,
+                "Processing in progress, please wait... I'll let you know when it's done!"
+            )
+        except:
+            pass
+        
+        return jsonify({"status": "processing_in_progress"}), 200
+    
     try:
         # Check current state
         current_state = workflow.get_state(config)
@@ -172,10 +327,11 @@ def webhook():
                 print("\nRESUMING workflow...")
                 
                 # Resume with user message
-                result = workflow.invoke(
+                result = run_workflow(workflow.ainvoke(
                     Command(resume=text),
-                    config=config
-                )
+                    config=config,
+                    durability=WORKFLOW_DURABILITY
+                ))
                 
                 print(f"Workflow resume result received")
                 print(f"   Stage: {result.get('current_stage', 'N/A')}")
@@ -202,7 +358,7 @@ def webhook():
             initial_state = create_initial_state(phone, text)
             
             # Start workflow
-            result = workflow.invoke(initial_state, config=config)
+            result = run_workflow(workflow.ainvoke(initial_state, config=config, durability=WORKFLOW_DURABILITY))
             
             print(f"Workflow started")
             print(f"   Stage: {result.get('current_stage', 'N/A')}")
@@ -224,6 +380,24 @@ def webhook():
             pass
         
         return jsonify({"status": "error", "message": str(e)}), 500
+    
+    finally:
+        with running_threads_lock:
+            running_threads.discard(phone)
+
+
+@app.route('/suno/callback', methods=['POST'])
+def suno_callback():
+    """Suno task callback (SUNO_CALLBACK_URL) - wakes up the task's poller"""
+    
+    callback_data = request.get_json(silent=True) or {}
+    data = callback_data.get("data") or {}
+    task_id = data.get("task_id") or data.get("taskId")
+    
+    if task_id:
+        notify_task_update(task_id)
+    
+    return jsonify({"status": "received"}), 200
 
 
 @app.route('/health', methods=['GET'])
@@ -285,5 +459,6 @@ if __name__ == "__main__":
     print("  GET  /health      - Health check")
     print("  GET  /state/<phone> - Debug state")
     print("=" * 60 + "\n")
+    logger.info("Suno task callbacks: POST /suno/callback")
     
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -20,15 +20,9 @@ from suno_ai import SunoAPI
 load_dotenv()
 
 
-class MusicSupervizorAgentSystem:
-
-    def __init__(self):
-        self.llm = ChatOpenAI(model="gpt-4o")
-        self.suno_api = SunoAPI()
-    
+# Prompt templates are parsed once at import and shared by every call
 
-    def supervisor_agent(self, state: MusicGenerationState):
-        system_message = """You are a music production expert. You will select which tool to use based on the incoming request.
+SUPERVISOR_SYSTEM_MESSAGE = """You are a music production expert. You will select which tool to use based on the incoming request.
 
         generate_music: If the request is about generating music, use **generate_music**
         persona_saver: If the user liked the persona of the song you created, this saves the current song's persona. Use this endpoint if a matching request comes.
@@ -46,62 +40,19 @@ class MusicSupervizorAgentSystem:
         - If going to remake_music, detailed information about how the music will change.
 
         """
-    
-        human_message = """Request: {request}.
+
+SUPERVISOR_HUMAN_MESSAGE = """Request: {request}.
         
         Selected Song: {is_generated}
         You are expected to make a proper decision based on this request.
         """
 
-        supervisor_template = ChatPromptTemplate.from_messages(
-            [
-                ("system", system_message),
-                ("human", human_message)
-            ]
-        )
-
-
-        supervisor_chain = supervisor_template | self.llm.with_structured_output(MusicGenerationAgentBaseModel)
-
-        response = supervisor_chain.invoke({
-            "request": state["request"],
-            "is_generated": True if state.get("selected_audio_url", None) else False
-        })
-
-
-        goto = response.next
-        request_detail = response.request_detail
-
-
-        if goto == "persona_saver":
-            if len(state["generated_audio_urls"]) == 0:
-                print("No song has been generated yet")
-                return None
-
-
-        if goto == "return":
-            print("MusicSupervisor could not find a decision to make. Returning.")
-            print(request_detail)
-            return {
-                "request_details_from_supervisor": request_detail
-            }
-
-
-        print(f"--- Music Generation Workflow Transition: Router -> {goto.upper()} ---")
-
-        return Command(
-            update={
-                "step_list": [goto],
-                "request_details_from_supervisor": [request_detail]
-            },
-            goto=goto
-        )
+SUPERVISOR_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SUPERVISOR_SYSTEM_MESSAGE),
+    ("human", SUPERVISOR_HUMAN_MESSAGE)
+])
 
-
-    def generate_music(self, state: MusicGenerationState):
-        """Generates new music. Processes instructions from Supervisor with LLM."""
-        
-        system_message = """You are a professional music creation expert. Create a detailed music generation template according to the given instructions. The properties of the outputs I want from you are as follows:
+GENERATE_MUSIC_SYSTEM_MESSAGE = """You are a professional music creation expert. Create a detailed music generation template according to the given instructions. The properties of the outputs I want from you are as follows:
         ## IF WRITING A SONG WITH LYRICS, ONLY THE LYRICS SHOULD BE IN THE PROMPT.
         ## WRITE ALL OTHER INSTRUCTIONS IN ENGLISH. ONLY THE LYRICS IN THE PROMPT SHOULD BE IN THAT LANGUAGE.
         ## Don't hesitate to use negative_tags. You can remove elements that don't fit the context.
@@ -147,20 +98,126 @@ class MusicSupervizorAgentSystem:
         
         You are expected to generate a detailed and complete music generation guide suitable for the given task. Apply the instructions and pay attention to character limits.
         """
-        
-        human_message = """Instruction: {request_detail}
+
+GENERATE_MUSIC_HUMAN_MESSAGE = """Instruction: {request_detail}
         
         
         Generate music production parameters according to this instruction."""
+
+GENERATE_MUSIC_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", GENERATE_MUSIC_SYSTEM_MESSAGE),
+    ("human", GENERATE_MUSIC_HUMAN_MESSAGE)
+])
+
+PERSONA_SAVER_SYSTEM_MESSAGE = """You are a music persona saving expert. If the user is using you, they liked the previously generated song. From the given information:
+        persona_name: Name of the persona to be created (Short persona content e.g.: Electronic Pop Singer)
+        description: Description of the persona to be created (Important for persona, can also change based on these guidelines e.g.: A modern electronic music style pop singer, skilled in dynamic rhythms and synthesizer tones)
+        """
+
+PERSONA_SAVER_HUMAN_MESSAGE = """
+        The properties of the track whose persona I want you to save:
+
+        prompt used to generate music: {prompt}
+        
+        style used to generate music: {style}
+        
+        title used to generate music: {title}
+
+        instrumental: {instrumental} (True means no vocals in the track, False means it has lyrics)
+
+        Unwanted characteristics in music: {negative_tags}
+        
+        Persona's gender: {vocal_gender}
+
+        Weight of entered style on the track: {style_weight}
         
-        generate_music_template = ChatPromptTemplate.from_messages([
-            ("system", system_message),
-            ("human", human_message)
-        ])
+        Create name and description based on this given information.
+        """
+
+PERSONA_SAVER_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", PERSONA_SAVER_SYSTEM_MESSAGE),
+    ("human", PERSONA_SAVER_HUMAN_MESSAGE)
+])
+
+REMAKE_MUSIC_SYSTEM_MESSAGE = """You are a music recreation expert. Expand the music recreation based on the incoming request.
+        Your task is to transform a track into a new style while preserving the core melody.
+        Persona change may be requested; if so, fill in the relevant field in the template accordingly.
+
+        prompt: Detailed instruction for the music you're changing, write what you want not what's changing.
+        style: Enter the new music's style here (e.g.: Classical)
+        title: New Music's Title (e.g.: Peaceful Piano Meditation)
+        instrumental: True if new music will be without vocals, False if it will have lyrics
+        negative_tags: Enter components you don't want in the song (e.g.: Heavy Metal, Upbeat Drums)
+        vocal_gender: Gender of the new track's vocalist (f: female, m: male ONLY f OR m)
+        style_weight: Weight of provided style guidance (0 to 1)
+        weirdness_constraint: Constraint on creative deviation/novelty (0 to 1)
+        audio_weight: Weight of input audio (when applicable) (0 to 1)
+        
+        """
+
+REMAKE_MUSIC_HUMAN_MESSAGE = """You are asked to make changes based on this request:
+        Request: {request}
+        """
+
+REMAKE_MUSIC_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", REMAKE_MUSIC_SYSTEM_MESSAGE),
+    ("human", REMAKE_MUSIC_HUMAN_MESSAGE)
+])
+
+
+class MusicSupervizorAgentSystem:
+
+    def __init__(self):
+        self.llm = ChatOpenAI(model="gpt-4o")
+        self.suno_api = SunoAPI()
         
-        generate_music_chain = generate_music_template | self.llm.with_structured_output(MusicBaseModel)
+        # Structured-output chains are built once and reused on every call
+        self._supervisor_chain = SUPERVISOR_PROMPT | self.llm.with_structured_output(MusicGenerationAgentBaseModel)
+        self._generate_music_chain = GENERATE_MUSIC_PROMPT | self.llm.with_structured_output(MusicBaseModel)
+        self._persona_saver_chain = PERSONA_SAVER_PROMPT | self.llm.with_structured_output(PersonaChangerBaseModel)
+        self._remake_music_chain = REMAKE_MUSIC_PROMPT | self.llm.with_structured_output(MusicBaseModel)
+    
+
+    def supervisor_agent(self, state: MusicGenerationState):
+        response = self._supervisor_chain.invoke({
+            "request": state["request"],
+            "is_generated": True if state.get("selected_audio_url", None) else False
+        })
+
+
+        goto = response.next
+        request_detail = response.request_detail
+
+
+        if goto == "persona_saver":
+            if len(state["generated_audio_urls"]) == 0:
+                print("No song has been generated yet")
+                return None
+
+
+        if goto == "return":
+            print("MusicSupervisor could not find a decision to make. Returning.")
+            print(request_detail)
+            return {
+                "request_details_from_supervisor": request_detail
+            }
+
+
+        print(f"--- Music Generation Workflow Transition: Router -> {goto.upper()} ---")
+
+        return Command(
+            update={
+                "step_list": [goto],
+                "request_details_from_supervisor": [request_detail]
+            },
+            goto=goto
+        )
+
+
+    def generate_music(self, state: MusicGenerationState):
+        """Generates new music. Processes instructions from Supervisor with LLM."""
         
-        result = generate_music_chain.invoke({
+        result = self._generate_music_chain.invoke({
             "request_detail": state["request_details_from_supervisor"][-1],
         })
         
@@ -174,7 +231,7 @@ class MusicSupervizorAgentSystem:
             return {
                 "generated_audio_ids": api_result["generated_audio_ids"],
                 "generated_audio_urls": api_result["generated_audio_urls"],
-                "generated_audio_file_adress": api_result["generated_audio_file_adress"],
+                "generated_audio_file_paths": api_result["generated_audio_file_paths"],
                 "is_generated": True,
                 "step_list": state["step_list"] + ["generate_music"]
             }
@@ -190,42 +247,7 @@ class MusicSupervizorAgentSystem:
     def persona_saver(self, state: MusicGenerationState):
         """System that changes or adds a new personality/style to the music."""
 
-        system_message = """You are a music persona saving expert. If the user is using you, they liked the previously generated song. From the given information:
-        persona_name: Name of the persona to be created (Short persona content e.g.: Electronic Pop Singer)
-        description: Description of the persona to be created (Important for persona, can also change based on these guidelines e.g.: A modern electronic music style pop singer, skilled in dynamic rhythms and synthesizer tones)
-        """
-        
-        human_message = """
-        The properties of the track whose persona I want you to save:
-
-        prompt used to generate music: {prompt}
-        
-        style used to generate music: {style}
-        
-        title used to generate music: {title}
-
-        instrumental: {instrumental} (True means no vocals in the track, False means it has lyrics)
-
-        Unwanted characteristics in music: {negative_tags}
-        
-        Persona's gender: {vocal_gender}
-
-        Weight of entered style on the track: {style_weight}
-        
-        Create name and description based on this given information.
-        """
-
-
-        persona_saver_template = ChatPromptTemplate.from_messages(
-            [
-                ("system", system_message),
-                ("human", human_message)
-            ]
-        )
-
-        persona_saver_chain = persona_saver_template | self.llm.with_structured_output(PersonaChangerBaseModel)
-
-        result = persona_saver_chain.invoke(
+        result = self._persona_saver_chain.invoke(
             {
                 "prompt": state["prompt"],
                 "style": state["style"],
@@ -260,38 +282,7 @@ class MusicSupervizorAgentSystem:
     def remake_music(self, state: MusicGenerationState):
         """Transforms a track into a new style while preserving the core melody."""
 
-
-        system_message = """You are a music recreation expert. Expand the music recreation based on the incoming request.
-        Your task is to transform a track into a new style while preserving the core melody.
-        Persona change may be requested; if so, fill in the relevant field in the template accordingly.
-
-        prompt: Detailed instruction for the music you're changing, write what you want not what's changing.
-        style: Enter the new music's style here (e.g.: Classical)
-        title: New Music's Title (e.g.: Peaceful Piano Meditation)
-        instrumental: True if new music will be without vocals, False if it will have lyrics
-        negative_tags: Enter components you don't want in the song (e.g.: Heavy Metal, Upbeat Drums)
-        vocal_gender: Gender of the new track's vocalist (f: female, m: male ONLY f OR m)
-        style_weight: Weight of provided style guidance (0 to 1)
-        weirdness_constraint: Constraint on creative deviation/novelty (0 to 1)
-        audio_weight: Weight of input audio (when applicable) (0 to 1)
-        
-        """
-
-        human_message = """You are asked to make changes based on this request:
-        Request: {request}
-        """
-
-
-        remake_music_template = ChatPromptTemplate.from_messages(
-            [
-                ("system", system_message),
-                ("human", human_message)
-            ]
-        )
-
-        remake_music_chain = remake_music_template | self.llm.with_structured_output(MusicBaseModel)
-
-        result = remake_music_chain.invoke({
+        result = self._remake_music_chain.invoke({
             "request": state["request_details_from_supervisor"]
         })
 
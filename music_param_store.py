@@ -0,0 +1,106 @@
+"""
+Music Parameter Store
+=====================
+Nearest-neighbour memory of music requests and the Suno parameters generated
+for them, so near-identical requests can skip the music LLM call.
+
+Entries belong to the conversation (thread_id / phone number) that produced
+them: the parameters carry that user's lyrics, title and persona, so a request
+only ever reuses its own conversation's earlier results.
+"""
+
+import os
+import json
+import logging
+import threading
+from typing import Dict, List, Optional
+
+# numpy is optional - without it the store is disabled
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class MusicParamStore:
+    """Cosine-similarity lookup over embedded music requests, per owner (brute force, bounded size)"""
+
+    def __init__(self, path: str, threshold: float = 0.95, max_entries: int = 1000):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vectors = None  # (n, dim) float32, rows L2-normalized
+        self._payloads: List[Dict] = []
+        self._owners: List[str] = []  # thread_id of each row
+        self._next = 0  # Ring buffer slot overwritten once the store is full
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def _normalize(embedding: List[float]):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def match(self, owner: str, embedding: List[float]) -> Optional[Dict]:
+        """Payload of the owner's closest stored request, if it clears the threshold"""
+        with self._lock:
+            rows = [i for i, row_owner in enumerate(self._owners) if row_owner == owner]
+            if not rows:
+                return None
+            scores = self._vectors[rows] @ self._normalize(embedding)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            return dict(self._payloads[rows[best]])
+
+    def add(self, owner: str, embedding: List[float], payload: Dict):
+        """Remember a request for its owner; the oldest entry is replaced when full"""
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = vector[np.newaxis, :]
+                self._payloads.append(payload)
+                self._owners.append(owner)
+            elif len(self._payloads) < self.max_entries:
+                self._vectors = np.vstack([self._vectors, vector])
+                self._payloads.append(payload)
+                self._owners.append(owner)
+            else:
+                self._vectors[self._next] = vector
+                self._payloads[self._next] = payload
+                self._owners[self._next] = owner
+                self._next = (self._next + 1) % self.max_entries
+
+    def save(self):
+        """Write the store to disk for the next start"""
+        with self._lock:
+            if not self._payloads:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            np.savez(
+                self.path,
+                vectors=self._vectors,
+                payloads=json.dumps(self._payloads),
+                owners=json.dumps(self._owners),
+                next=self._next
+            )
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                # Stores written before entries had owners can't be attributed: start empty
+                if "owners" not in data:
+                    return
+                self._vectors = data["vectors"]
+                self._payloads = json.loads(str(data["payloads"]))
+                self._owners = json.loads(str(data["owners"]))
+                self._next = int(data["next"])
+        except Exception as e:
+            logger.warning("Music parameter store could not be loaded: %s", e)
+            self._vectors, self._payloads, self._owners, self._next = None, [], [], 0
@@ -6,7 +6,9 @@ SQLite-based persona management.
 
 import sqlite3
 import os
-from typing import List, Dict, Optional
+import time
+import threading
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 
 
@@ -15,6 +17,17 @@ class PersonaDB:
     
     DB_PATH = "artifacts/databases/personas.db"
     
+    # list_personas() result is reused for this many seconds; writes invalidate it
+    LIST_CACHE_TTL = 60
+    _list_cache: Optional[Tuple[float, List[Dict]]] = None
+    _cache_lock = threading.Lock()
+    
+    @classmethod
+    def invalidate_cache(cls):
+        """Drop the cached persona list"""
+        with cls._cache_lock:
+            cls._list_cache = None
+    
     @classmethod
     def _ensure_db_dir(cls):
         """Create database directory"""
@@ -68,11 +81,16 @@ class PersonaDB:
         
         conn.commit()
         conn.close()
+        cls.invalidate_cache()
         print(f"Persona saved: {persona_data.get('name')}")
     
     @classmethod
     def list_personas(cls) -> List[Dict]:
-        """List all personas"""
+        """List all personas (served from a short-lived cache)"""
+        cached = cls._list_cache
+        if cached and time.monotonic() - cached[0] < cls.LIST_CACHE_TTL:
+            return [dict(p) for p in cached[1]]
+        
         conn = cls._get_connection()
         cursor = conn.cursor()
         
@@ -82,7 +100,9 @@ class PersonaDB:
         personas = [dict(row) for row in rows]
         
         conn.close()
-        return personas
+        with cls._cache_lock:
+            cls._list_cache = (time.monotonic(), personas)
+        return [dict(p) for p in personas]
     
     @classmethod
     def get_persona(cls, persona_id: str) -> Optional[Dict]:
@@ -115,6 +135,7 @@ class PersonaDB:
         
         conn.commit()
         conn.close()
+        cls.invalidate_cache()
         print(f"Persona deleted: {persona_id}")
     
     @classmethod
@@ -1,5 +1,16 @@
 from typing import TypedDict, Optional, List, Dict, Literal, Annotated
-from operator import add
+
+
+# Prompts only read the last few messages; older ones are dropped from state
+MESSAGE_HISTORY_LIMIT = 50
+
+
+def add_recent_messages(left: List[str], right: List[str]) -> List[str]:
+    """messages reducer: appends like operator.add, keeps the last MESSAGE_HISTORY_LIMIT"""
+    merged = left + right
+    if len(merged) > MESSAGE_HISTORY_LIMIT:
+        del merged[:-MESSAGE_HISTORY_LIMIT]
+    return merged
 
 
 class UnifiedState(TypedDict):
@@ -11,7 +22,7 @@ class UnifiedState(TypedDict):
     
     # ============== USER & COMMUNICATION ==============
     phone_number: str
-    messages: Annotated[List[str], add]  # String messages, combined with add
+    messages: Annotated[List[str], add_recent_messages]  # String messages, appended and trimmed
     user_request: Optional[str]  # User's original request
     
     # Communication agent decisions
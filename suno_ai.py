@@ -2,111 +2,454 @@
 Suno AI API Wrapper
 ===================
 Suno API integration for music generation, remake and persona management.
+
+Every generation call has a sync and an async variant (create_music /
+acreate_music, remake_music / aremake_music, wait_and_download /
+await_and_download). The async ones share one httpx.AsyncClient pool so
+several generations can run concurrently on one event loop.
 """
 
 import os
 import time
+import atexit
+import asyncio
+import logging
+import pathlib
+import threading
+import httpx
 import requests
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor, Future
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Any, Optional, Tuple, List, Callable
 from dotenv import load_dotenv
 from personadb_utils import PersonaDB
 from base_models import MusicBaseModel
 
+# orjson is optional - parses bytes directly, falls back to stdlib json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    import json
+    ORJSON_AVAILABLE = False
+
+# diskcache is optional - completed tasks survive process restarts
+try:
+    import diskcache
+    DISKCACHE_AVAILABLE = True
+except ImportError:
+    DISKCACHE_AVAILABLE = False
+
+# h2 is optional - without it the httpx clients speak HTTP/1.1
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Suno request constants
+BASE_URL = "https://api.sunoapi.org/api/v1"
+GENERATE_PATH = "/generate"
+REMAKE_PATH = "/generate/upload-cover"
+PERSONA_PATH = "/generate/generate-persona"
+RECORD_INFO_PATH = "/generate/record-info"
+CALLBACK_URL = os.getenv("SUNO_CALLBACK_URL", "https://example.com/callback")
+DEFAULT_MODEL = "V4"
+# Fields every generate / upload-cover body carries unchanged
+PAYLOAD_CONSTANTS = {"customMode": True, "callBackUrl": CALLBACK_URL}
+MUSIC_DIR = "artifacts/musics"
+# An existing file at least this big is treated as an already downloaded track
+MIN_TRACK_BYTES = 1024
+CACHE_DIR = "artifacts/.suno_cache"
+# Disk cache bounds: the oldest entries are culled past the size limit;
+# task results expire before Suno's audio links do, persona IDs are kept longer
+CACHE_SIZE_LIMIT = 64 * 1024 * 1024
+TASK_CACHE_EXPIRE = 24 * 3600
+PERSONA_CACHE_EXPIRE = 30 * 24 * 3600
+
+# Download pool shared by every SunoAPI instance (tracks download in parallel)
+DOWNLOAD_WORKERS = 8
+_download_pool = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS, thread_name_prefix="suno-download")
+
+# Persona DB writes run off the request path; a single worker keeps them ordered
+_persona_saver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persona-saver")
+atexit.register(_persona_saver.shutdown, wait=True)
+
+# Streaming download chunk size (bytes)
+DOWNLOAD_CHUNK_SIZE = 1 << 17
+
+# MP3 is already compressed - ask the CDN not to gzip it
+DOWNLOAD_HEADERS = {"Accept-Encoding": "identity"}
+DOWNLOAD_TIMEOUT = (5, 120)
+
+# Poll fast at first and back off (seconds, capped at poll_interval).
+# After the first stage (lyrics) is ready the schedule restarts so the
+# second stage is picked up promptly.
+POLL_SCHEDULE = (2, 3, 5, 8, 13, 20)
+POLL_SCHEDULE_AFTER_FIRST_STAGE = (3, 5, 8, 13, 20)
+
+# (connect, read) timeouts for Suno API calls - a hung endpoint must not wedge the workflow
+API_TIMEOUT = (5, 30)
+
+# Transient failures (connection errors, 429 / 5xx) are retried with backoff
+# instead of waiting for the next poll
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+API_STATUS_RETRIES = 3
+API_BACKOFF = 0.5
+
+# Retry policy of the requests session (CDN downloads)
+DOWNLOAD_RETRY = Retry(
+    total=5,
+    connect=3,
+    read=3,
+    status=API_STATUS_RETRIES,
+    backoff_factor=API_BACKOFF,
+    status_forcelist=sorted(RETRY_STATUSES),
+    allowed_methods=["GET"]
+)
+
+# httpx client settings (API calls, and async downloads)
+HTTPX_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20)
+HTTPX_TIMEOUT = httpx.Timeout(API_TIMEOUT[1], connect=API_TIMEOUT[0])
+HTTPX_CONNECT_RETRIES = 3
+
+
+# record-info task statuses (SUCCESS means fully complete, anything else keeps polling)
+_TERMINAL_FAILURES = frozenset({"FAILED", "ERROR", "CANCELLED"})
+_INTERIM_OK = frozenset({"TEXT_SUCCESS", "FIRST_SUCCESS"})
+
+# Fields Suno has used for a track's URL / ID, in order of preference
+_AUDIO_URL_KEYS = ("audioUrl", "audio_url", "streamAudioUrl", "sourceAudioUrl")
+_AUDIO_ID_KEYS = ("id", "audioId")
+
+
+# Suno callbacks (POST CALLBACK_URL) wake up the poll loop of their task
+# early; record-info stays the source of truth
+_task_waiters: Dict[str, List[Callable[[], None]]] = {}
+_task_waiters_lock = threading.Lock()
+
+
+def _add_task_waiter(task_id: str, wake: Callable[[], None]):
+    """Registers a wake-up callable for task_id"""
+    with _task_waiters_lock:
+        _task_waiters.setdefault(task_id, []).append(wake)
+
+
+def _remove_task_waiter(task_id: str, wake: Callable[[], None]):
+    """Unregisters a wake-up callable of task_id"""
+    with _task_waiters_lock:
+        waiters = _task_waiters.get(task_id, [])
+        if wake in waiters:
+            waiters.remove(wake)
+        if not waiters:
+            _task_waiters.pop(task_id, None)
+
+
+def notify_task_update(task_id: str) -> bool:
+    """
+    Called by the Suno callback route. Makes every poller of task_id check
+    record-info right away. Returns False if nobody is waiting for the task.
+    """
+    with _task_waiters_lock:
+        waiters = list(_task_waiters.get(task_id, ()))
+    for wake in waiters:
+        wake()
+    return bool(waiters)
+
+
+def _first_present(d: Dict[str, Any], keys: Tuple[str, ...]) -> Any:
+    """First truthy value among keys, "" if none"""
+    for key in keys:
+        value = d.get(key)
+        if value:
+            return value
+    return ""
+
+
+def _open_track_file(path: pathlib.Path, size: int) -> int:
+    """
+    Opens a raw fd for a download, preallocating size bytes when the server
+    sent Content-Length (posix_fallocate is Linux/Unix only).
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    if size:
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except (AttributeError, OSError):
+            pass
+    return fd
+
+
+def _write_all(fd: int, chunk: bytes) -> int:
+    """os.write until the whole chunk is on disk, returns its length"""
+    view = memoryview(chunk)
+    while view:
+        view = view[os.write(fd, view):]
+    return len(chunk)
+
+
+def _loads(raw: bytes) -> Any:
+    """Parse a JSON response body"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _dumps(obj: Any) -> bytes:
+    """Serialize a JSON request body"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+
+def _log_persona_save_error(future):
+    """Done-callback for background persona saves"""
+    if future.exception() is not None:
+        logger.error("Persona DB save failed: %s", future.exception(), exc_info=future.exception())
+
 
 class SunoAPI:
     """Suno AI API wrapper"""
 
     def __init__(self):
         self.suno_api_key = os.getenv("SUNO_AI_API_KEY")
-        self.base_url = "https://api.sunoapi.org/api/v1"
+        self.base_url = BASE_URL
         self.headers = {
             "Authorization": f"Bearer {self.suno_api_key}",
             "Content-Type": "application/json"
         }
         
+        # Suno API calls (generate, polling, persona) multiplex over one
+        # HTTP/2 connection when h2 is installed
+        self.client = httpx.Client(
+            base_url=self.base_url,
+            headers=self.headers,
+            transport=httpx.HTTPTransport(
+                http2=HTTP2_AVAILABLE,
+                limits=HTTPX_LIMITS,
+                retries=HTTPX_CONNECT_RETRIES
+            ),
+            timeout=HTTPX_TIMEOUT
+        )
+        
+        # Pooled keep-alive session for MP3 downloads from the CDN (no auth headers)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=20,
+            max_retries=DOWNLOAD_RETRY
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        
+        # Async client is bound to an event loop, so it is created lazily
+        self._aclient: Optional[httpx.AsyncClient] = None
+        self._aclient_loop: Optional[asyncio.AbstractEventLoop] = None
+
         # Create directories
-        os.makedirs("artifacts/musics", exist_ok=True)
+        self.music_dir = pathlib.Path(MUSIC_DIR)
+        self.music_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Completed task / persona results, keyed under the API base URL
+        self.cache = diskcache.Cache(CACHE_DIR, size_limit=CACHE_SIZE_LIMIT) if DISKCACHE_AVAILABLE else None
+        
+        # Singleflight: a task that is already being polled is not polled twice,
+        # later callers wait for the first one's result
+        self._inflight: Dict[Tuple[str, bool], Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._ainflight: Dict[Tuple[str, bool], asyncio.Task] = {}
+
+    def _get_aclient(self) -> httpx.AsyncClient:
+        """Returns the AsyncClient of the running event loop, creating it on first use."""
+        
+        loop = asyncio.get_running_loop()
+            
+        if self._aclient is None or self._aclient.is_closed or self._aclient_loop is not loop:
+            # httpx transports only retry failed connects, 429 / 5xx are retried in _aapi_request
+            transport = httpx.AsyncHTTPTransport(
+                http2=HTTP2_AVAILABLE,
+                limits=HTTPX_LIMITS,
+                retries=HTTPX_CONNECT_RETRIES
+            )
+            self._aclient = httpx.AsyncClient(
+                base_url=self.base_url,
+                transport=transport,
+                timeout=HTTPX_TIMEOUT
+            )
+            self._aclient_loop = loop
+        
+        return self._aclient
+
+    def close(self):
+        """Closes the sync HTTP clients."""
+        self.client.close()
+        self.session.close()
+
+    async def aclose(self):
+        """Closes the async client (call from the loop that used it)."""
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient = None
+            self._aclient_loop = None
+
+    def _api_request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Sends a Suno API request, retrying 429 / 5xx with exponential backoff."""
+        
+        for attempt in range(API_STATUS_RETRIES + 1):
+            response = self.client.request(method, path, **kwargs)
+            if response.status_code not in RETRY_STATUSES or attempt == API_STATUS_RETRIES:
+                return response
+            time.sleep(API_BACKOFF * 2 ** attempt)
+
+    async def _aapi_request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Async _api_request"""
+        
+        client = self._get_aclient()
+        
+        for attempt in range(API_STATUS_RETRIES + 1):
+            response = await client.request(method, path, headers=self.headers, **kwargs)
+            if response.status_code not in RETRY_STATUSES or attempt == API_STATUS_RETRIES:
+                return response
+            await asyncio.sleep(API_BACKOFF * 2 ** attempt)
+
+    # ==================== GENERATION ====================
+
+    def _music_payload(self, state: Dict[str, Any], music_params: MusicBaseModel) -> Dict[str, Any]:
+        """
+        Builds the generate / upload-cover request body.
+        MusicBaseModel carries the Suno (camelCase) names as serialization aliases.
+        """
+
+        payload = music_params.model_dump(by_alias=True)
+        payload.update(PAYLOAD_CONSTANTS)
+        payload["model"] = state.get("music_generation_model", DEFAULT_MODEL)
+
+        # Add if persona selected
+        if state.get("selected_persona_id"):
+            payload["personaId"] = state["selected_persona_id"]
+
+        return payload
+
+    @staticmethod
+    def _remake_source(state: Dict[str, Any]) -> Optional[str]:
+        """Selected track, otherwise the first generated one."""
+
+        source_url = state.get("selected_audio_url")
+        if not source_url:
+            # Use one of the generated music
+            urls = state.get("generated_audio_urls", [])
+            if urls:
+                source_url = urls[0]
+
+        return source_url
+
+    @staticmethod
+    def _generation_result(state: Dict[str, Any], result: Dict[str, Any], failure: str) -> Dict[str, Any]:
+        """Writes finished tracks into state and builds the create/remake return value."""
+
+        if not result["is_generate"]:
+            logger.warning("%s: %s", failure, result.get("reason"))
+            return {
+                "is_generated": False,
+                "current_state": state,
+                "error": result.get("reason", failure)
+            }
+
+        # Update state - only tracks that reached disk, so ids/urls/paths stay index-aligned
+        audio_data = [d for d in result["data"] if d.get("downloaded_file_path")]
+
+        ids, urls, paths = zip(*(
+            (d["audio_id"], d["audio_url"], d["downloaded_file_path"]) for d in audio_data
+        )) if audio_data else ((), (), ())
+        
+        state["generated_audio_ids"] = list(ids)
+        state["generated_audio_urls"] = list(urls)
+        state["generated_audio_file_paths"] = list(paths)
+
+        logger.info("%d music tracks generated", len(audio_data))
+
+        return {"is_generated": True, "current_state": state}
 
     def create_music(self, state: Dict[str, Any], music_params: MusicBaseModel) -> Dict[str, Any]:
         """
         Generates new music.
-        
+
         Args:
             state: Current workflow state
             music_params: Music generation parameters
-            
+
         Returns:
             {"is_generated": bool, "current_state": state, "error": str (optional)}
         """
-        
-        generate_url = f"{self.base_url}/generate"
-        
-        payload = {
-            "prompt": music_params.prompt,
-            "style": music_params.style,
-            "title": music_params.title,
-            "instrumental": music_params.instrumental,
-            "negativeTags": music_params.negative_tags,
-            "vocalGender": music_params.vocal_gender,
-            "styleWeight": music_params.style_weight,
-            "weirdnessConstraint": music_params.weirdness_constraint,
-            "audioWeight": music_params.audio_weight,
-            "customMode": True,
-            "model": state.get("music_generation_model", "V4"),
-            "callBackUrl": "https://example.com/callback"
-        }
 
-        # Add if persona selected
-        if state.get("selected_persona_id"):
-            payload["personaId"] = state["selected_persona_id"]
+        payload = self._music_payload(state, music_params)
 
-        print("Sending request to Suno API...")
+        logger.info("Sending request to Suno API...")
         
         try:
-            response = requests.post(generate_url, json=payload, headers=self.headers)
-            generation_data = response.json()
+            response = self._api_request("POST", GENERATE_PATH, content=_dumps(payload))
+            generation_data = _loads(response.content)
             
-            print(f"   API Response Code: {generation_data.get('code')}")
+            logger.info("API response code: %s", generation_data.get("code"))
 
             if generation_data.get("code") != 200:
-                print(f"   API Error: {generation_data}")
+                logger.warning("API error: %s", generation_data)
                 return {
                     "is_generated": False, 
                     "current_state": state,
                     "error": f"API error: {generation_data.get('message', 'Unknown')}"
                 }
 
-            time.sleep(1)
-            
             task_id = generation_data["data"]["taskId"]
-            print(f"   Task ID: {task_id}")
+            logger.info("Task ID: %s", task_id)
 
             # Wait and download music
             result = self.wait_and_download(task_id)
+            return self._generation_result(state, result, "Generation failed")
+
+        except Exception as e:
+            logger.exception("Music generation exception: %s", e)
+            return {
+                "is_generated": False,
+                "current_state": state,
+                "error": str(e)
+            }
+
+    async def acreate_music(self, state: Dict[str, Any], music_params: MusicBaseModel) -> Dict[str, Any]:
+        """Async create_music - same arguments and return value."""
+
+        payload = self._music_payload(state, music_params)
+
+        logger.info("Sending request to Suno API...")
+
+        try:
+            response = await self._aapi_request("POST", GENERATE_PATH, content=_dumps(payload))
+            generation_data = _loads(response.content)
+
+            logger.info("API response code: %s", generation_data.get("code"))
 
-            if not result["is_generate"]:
-                print(f"   Generation failed: {result.get('reason')}")
+            if generation_data.get("code") != 200:
+                logger.warning("API error: %s", generation_data)
                 return {
                     "is_generated": False, 
                     "current_state": state,
-                    "error": result.get("reason", "Generation failed")
+                    "error": f"API error: {generation_data.get('message', 'Unknown')}"
                 }
 
-            # Update state
-            audio_data = result["data"]
-            
-            state["generated_audio_ids"] = [d["audio_id"] for d in audio_data]
-            state["generated_audio_urls"] = [d["audio_url"] for d in audio_data]
-            state["generated_audio_file_adress"] = [d["downloaded_file_path"] for d in audio_data]
+            task_id = generation_data["data"]["taskId"]
+            logger.info("Task ID: %s", task_id)
             
-            print(f"   {len(audio_data)} music tracks generated!")
-
-            return {"is_generated": True, "current_state": state}
+            # Wait and download music
+            result = await self.await_and_download(task_id)
+            return self._generation_result(state, result, "Generation failed")
             
         except Exception as e:
-            print(f"   Exception: {e}")
+            logger.exception("Music generation exception: %s", e)
             return {
                 "is_generated": False, 
                 "current_state": state,
@@ -125,48 +468,24 @@ class SunoAPI:
             {"is_generated": bool, "current_state": state, "error": str (optional)}
         """
         
-        print("Music Remake starting...")
-        
-        remake_url = f"{self.base_url}/generate/upload-cover"
+        logger.info("Music remake starting...")
         
-        source_url = state.get("selected_audio_url")
+        source_url = self._remake_source(state)
         if not source_url:
-            # Use one of the generated music
-            urls = state.get("generated_audio_urls", [])
-            if urls:
-                source_url = urls[0]
-            else:
-                return {
-                    "is_generated": False,
-                    "current_state": state,
-                    "error": "No source audio for remake"
-                }
+            return {
+                "is_generated": False,
+                "current_state": state,
+                "error": "No source audio for remake"
+            }
         
-        payload = {
-            "uploadUrl": source_url,
-            "prompt": remake_params.prompt,
-            "style": remake_params.style,
-            "title": remake_params.title,
-            "instrumental": remake_params.instrumental,
-            "negativeTags": remake_params.negative_tags,
-            "vocalGender": remake_params.vocal_gender,
-            "styleWeight": remake_params.style_weight,
-            "weirdnessConstraint": remake_params.weirdness_constraint,
-            "audioWeight": remake_params.audio_weight,
-            "customMode": True,
-            "model": state.get("music_generation_model", "V4"),
-            "callBackUrl": "https://example.com/callback"
-        }
-
-        if state.get("selected_persona_id"):
-            payload["personaId"] = state["selected_persona_id"]
+        payload = {"uploadUrl": source_url, **self._music_payload(state, remake_params)}
 
         try:
-            print("Sending request to Remake API...")
-            response = requests.post(remake_url, json=payload, headers=self.headers)
-            data = response.json()
+            logger.info("Sending request to Remake API...")
+            response = self._api_request("POST", REMAKE_PATH, content=_dumps(payload))
+            data = _loads(response.content)
             
-            print(f"   API Response Code: {data.get('code')}")
+            logger.info("API response code: %s", data.get("code"))
 
             if data.get("code") != 200:
                 return {
@@ -176,31 +495,58 @@ class SunoAPI:
                 }
 
             task_id = data["data"]["taskId"]
-            print(f"   Task ID: {task_id}")
+            logger.info("Task ID: %s", task_id)
 
             # Wait and download
             result = self.wait_and_download(task_id)
+            return self._generation_result(state, result, "Remake failed")
+
+        except Exception as e:
+            logger.exception("Remake exception: %s", e)
+            return {
+                "is_generated": False,
+                "current_state": state,
+                "error": str(e)
+            }
+
+    async def aremake_music(self, state: Dict[str, Any], remake_params: MusicBaseModel) -> Dict[str, Any]:
+        """Async remake_music - same arguments and return value."""
+
+        logger.info("Music remake starting...")
+
+        source_url = self._remake_source(state)
+        if not source_url:
+            return {
+                "is_generated": False,
+                "current_state": state,
+                "error": "No source audio for remake"
+            }
+
+        payload = {"uploadUrl": source_url, **self._music_payload(state, remake_params)}
+
+        try:
+            logger.info("Sending request to Remake API...")
+            response = await self._aapi_request("POST", REMAKE_PATH, content=_dumps(payload))
+            data = _loads(response.content)
+
+            logger.info("API response code: %s", data.get("code"))
 
-            if not result["is_generate"]:
+            if data.get("code") != 200:
                 return {
                     "is_generated": False, 
                     "current_state": state,
-                    "error": result.get("reason", "Remake failed")
+                    "error": f"API error: {data.get('message', 'Unknown')}"
                 }
 
-            # Update state
-            audio_data = result["data"]
-            
-            state["generated_audio_ids"] = [d["audio_id"] for d in audio_data]
-            state["generated_audio_urls"] = [d["audio_url"] for d in audio_data]
-            state["generated_audio_file_adress"] = [d["downloaded_file_path"] for d in audio_data]
+            task_id = data["data"]["taskId"]
+            logger.info("Task ID: %s", task_id)
             
-            print(f"   Remake completed!")
-
-            return {"is_generated": True, "current_state": state}
+            # Wait and download
+            result = await self.await_and_download(task_id)
+            return self._generation_result(state, result, "Remake failed")
 
         except Exception as e:
-            print(f"   Remake Exception: {e}")
+            logger.exception("Remake exception: %s", e)
             return {
                 "is_generated": False, 
                 "current_state": state,
@@ -218,9 +564,7 @@ class SunoAPI:
             Updated state
         """
         
-        print("Creating persona...")
-        
-        create_persona_url = f"{self.base_url}/generate/generate-persona"
+        logger.info("Creating persona...")
         
         # Get required info
         task_id = state.get("persona_saver_task_id")
@@ -239,163 +583,402 @@ class SunoAPI:
             "description": state.get("persona_saver_description", "Auto-generated persona")
         }
 
+        cache_key = f"{self.base_url}:persona:{task_id}:{audio_id}"
+        cached_persona = self.cache.get(cache_key) if self.cache is not None else None
+        
+        if cached_persona:
+            # Same track was already turned into a persona (and saved)
+            state["created_persona_id"] = cached_persona.get("personaId")
+            state["is_persona_saved"] = True
+            logger.info("Persona already created: %s", state["created_persona_id"])
+            return state
+
         try:
-            response = requests.post(create_persona_url, json=payload, headers=self.headers)
-            data = response.json()
+            response = self._api_request("POST", PERSONA_PATH, content=_dumps(payload))
+            data = _loads(response.content)
 
             if data.get("code") == 200:
                 persona_data = data["data"]
                 state["created_persona_id"] = persona_data.get("personaId")
                 
-                # Save to database
-                PersonaDB.save_persona(persona_data)
+                # Save to database in the background
+                _persona_saver.submit(PersonaDB.save_persona, persona_data).add_done_callback(_log_persona_save_error)
+                
+                if self.cache is not None:
+                    self.cache.set(cache_key, persona_data, expire=PERSONA_CACHE_EXPIRE)
                 
                 state["is_persona_saved"] = True
-                print(f"   Persona saved: {state['created_persona_id']}")
+                logger.info("Persona saved: %s", state["created_persona_id"])
             else:
                 state["is_persona_saved"] = False
-                print(f"   Persona could not be saved: {data}")
+                logger.warning("Persona could not be saved: %s", data)
 
         except Exception as e:
             state["is_persona_saved"] = False
-            print(f"   Persona Exception: {e}")
+            logger.exception("Persona exception: %s", e)
 
         return state
 
+
+    # ==================== POLLING / DOWNLOAD ====================
+
     def wait_and_download(self, task_id: str, max_wait: int = 400, poll_interval: int = 20, download: bool = True) -> Dict[str, Any]:
         """
         Polls until task completes and downloads results.
         
+        Polling and downloading are split: once the task succeeds, the ready
+        tracks are downloaded in parallel on the shared download pool.
+        
         Args:
             task_id: Suno task ID
             max_wait: Maximum wait time (seconds) - default 400
-            poll_interval: Check interval (seconds) - default 20
+            poll_interval: Maximum check interval (seconds) - default 20
             download: Download music?
             
         Returns:
             {"is_generate": bool, "data": [...], "reason": str (optional)}
         """
         
-        record_info_url = f"{self.base_url}/generate/record-info"
+        key = (task_id, download)
+        
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self._inflight[key] = Future()
         
-        print(f"   Polling starting (max {max_wait}s, every {poll_interval}s)")
+        if not is_owner:
+            logger.info("Task %s is already being polled, waiting for that result", task_id)
+            return future.result()
         
+        try:
+            result = self._wait_and_download(task_id, max_wait, poll_interval, download)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def _wait_and_download(self, task_id: str, max_wait: int, poll_interval: int, download: bool) -> Dict[str, Any]:
+        """wait_and_download without the singleflight guard"""
+        
+        cache_key = f"{self.base_url}:task:{task_id}"
+        cached = self.cache.get(cache_key) if self.cache is not None else None
+        
+        if cached and cached["is_generate"]:
+            logger.info("Task %s already completed, using cached result", task_id)
+            result = cached
+        else:
+            result = self._poll_tracks(task_id, max_wait, poll_interval)
+        
+        if download and result["is_generate"]:
+            # map() keeps track order (Version 1 / Version 2)
+            result["data"] = list(_download_pool.map(self._download_one, result["data"]))
+        
+        if self.cache is not None and result["is_generate"] and result is not cached:
+            self.cache.set(cache_key, result, expire=TASK_CACHE_EXPIRE)
+        
+        return result
+
+    async def await_and_download(self, task_id: str, max_wait: int = 400, poll_interval: int = 20, download: bool = True) -> Dict[str, Any]:
+        """Async wait_and_download - tracks download concurrently on the event loop."""
+        
+        key = (task_id, download)
+        task = self._ainflight.get(key)
+        
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            logger.info("Task %s is already being polled, waiting for that result", task_id)
+        else:
+            task = asyncio.ensure_future(self._await_and_download(task_id, max_wait, poll_interval, download))
+            self._ainflight[key] = task
+            task.add_done_callback(lambda t: self._ainflight.pop(key, None) if self._ainflight.get(key) is t else None)
+        
+        # shield: a cancelled caller must not cancel the poll other callers wait on
+        return await asyncio.shield(task)
+
+    async def _await_and_download(self, task_id: str, max_wait: int, poll_interval: int, download: bool) -> Dict[str, Any]:
+        """await_and_download without the singleflight guard"""
+        
+        cache_key = f"{self.base_url}:task:{task_id}"
+        cached = self.cache.get(cache_key) if self.cache is not None else None
+        
+        if cached and cached["is_generate"]:
+            logger.info("Task %s already completed, using cached result", task_id)
+            result = cached
+        else:
+            result = await self._apoll_tracks(task_id, max_wait, poll_interval)
+        
+        if download and result["is_generate"]:
+            # gather() keeps track order (Version 1 / Version 2)
+            result["data"] = list(await asyncio.gather(*(self._adownload_one(d) for d in result["data"])))
+        
+        if self.cache is not None and result["is_generate"] and result is not cached:
+            self.cache.set(cache_key, result, expire=TASK_CACHE_EXPIRE)
+        
+        return result
+
+    def _poll_tracks(self, task_id: str, max_wait: int, poll_interval: int) -> Dict[str, Any]:
+        """
+        Polls record-info until the task finishes.
+        Returns the ready tracks (not downloaded yet).
+        """
+        
+        logger.info("Polling starting (max %ss, up to every %ss)", max_wait, poll_interval)
+        
+        # A Suno callback for this task ends the current wait early
+        wakeup = threading.Event()
+        _add_task_waiter(task_id, wakeup.set)
+        
+        start = time.monotonic()
         elapsed = 0
         last_status = None
+        schedule = iter(POLL_SCHEDULE)
         
-        while elapsed < max_wait:
-            time.sleep(poll_interval)
-            elapsed += poll_interval
-            
-            try:
-                response = requests.get(
-                    f"{record_info_url}?taskId={task_id}",
-                    headers=self.headers
-                )
-                data = response.json()
-
-                if "data" not in data:
-                    print(f"   [{elapsed}s] No data, waiting...")
-                    continue
-
-                status = data["data"].get("status")
+        try:
+            while elapsed < max_wait:
+                if wakeup.wait(min(next(schedule, poll_interval), poll_interval)):
+                    wakeup.clear()
+                elapsed = round(time.monotonic() - start)
                 
-                # Log if status changed
-                if status != last_status:
-                    print(f"   [{elapsed}s] Status: {status}")
+                try:
+                    response = self._api_request("GET", RECORD_INFO_PATH, params={"taskId": task_id})
+                    status, result = self._check_record(_loads(response.content), elapsed, last_status)
+                    
+                    if result is not None:
+                        return result
+                    
+                    if status != last_status and status in _INTERIM_OK:
+                        schedule = iter(POLL_SCHEDULE_AFTER_FIRST_STAGE)
                     last_status = status
+                    
+                except Exception as e:
+                    logger.warning("[%ss] Polling error: %s", elapsed, e)
+                    continue
+        finally:
+            _remove_task_waiter(task_id, wakeup.set)
+        
+        # Timeout
+        logger.warning("Timeout (%ss)", max_wait)
+        return {"is_generate": False, "reason": "timeout"}
 
-                # Success states - only SUCCESS means fully complete
-                if status == "SUCCESS":
-                    print(f"   Generation completed! ({elapsed}s)")
+    async def _apoll_tracks(self, task_id: str, max_wait: int, poll_interval: int) -> Dict[str, Any]:
+        """Async _poll_tracks - waits on the event loop between checks."""
+        
+        logger.info("Polling starting (max %ss, up to every %ss)", max_wait, poll_interval)
+        
+        # Callbacks arrive on a Flask thread, hand them to this loop
+        wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        wake = lambda: loop.call_soon_threadsafe(wakeup.set)
+        _add_task_waiter(task_id, wake)
+        
+        start = time.monotonic()
+        elapsed = 0
+        last_status = None
+        schedule = iter(POLL_SCHEDULE)
+        
+        try:
+            while elapsed < max_wait:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), min(next(schedule, poll_interval), poll_interval))
+                except asyncio.TimeoutError:
+                    pass
+                wakeup.clear()
+                elapsed = round(time.monotonic() - start)
+                
+                try:
+                    response = await self._aapi_request("GET", RECORD_INFO_PATH, params={"taskId": task_id})
+                    status, result = self._check_record(_loads(response.content), elapsed, last_status)
                     
-                    suno_data = data["data"]["response"].get("sunoData", [])
+                    if result is not None:
+                        return result
                     
-                    # Debug: show response structure
-                    print(f"   Suno data count: {len(suno_data)}")
-                    if suno_data:
-                        print(f"   First item keys: {list(suno_data[0].keys())}")
-
-                    if not suno_data:
-                        print("   Music data empty")
-                        return {"is_generate": False, "reason": "no_audio_data"}
-
-                    audio_details = []
-
-                    for idx, audio_feature in enumerate(suno_data):
-                        # audioUrl may be in different keys
-                        audio_url = (
-                            audio_feature.get("audioUrl") or 
-                            audio_feature.get("audio_url") or 
-                            audio_feature.get("streamAudioUrl") or
-                            audio_feature.get("sourceAudioUrl") or
-                            ""
-                        )
-                        
-                        audio_id = (
-                            audio_feature.get("id") or 
-                            audio_feature.get("audioId") or
-                            f"unknown_{idx}"
-                        )
-                        
-                        print(f"   Item {idx}: id={audio_id}, url={audio_url[:50] if audio_url else 'EMPTY'}...")
-                        
-                        # If audioUrl empty, this track is not ready yet
-                        if not audio_url:
-                            print(f"   Audio URL empty, skipping: {audio_id}")
-                            continue
-                        
-                        detail = {
-                            "audio_id": audio_id,
-                            "audio_url": audio_url,
-                            "downloaded": False,
-                            "downloaded_file_path": None
-                        }
-
-                        if download and audio_url:
-                            try:
-                                file_name = f"{audio_id}.mp3"
-                                file_path = f"artifacts/musics/{file_name}"
-                                
-                                audio_response = requests.get(audio_url)
-                                if audio_response.status_code == 200:
-                                    with open(file_path, "wb") as f:
-                                        f.write(audio_response.content)
-
-                                    detail["downloaded"] = True
-                                    detail["downloaded_file_path"] = file_path
-                                    print(f"   Downloaded: {file_path}")
-                                else:
-                                    print(f"   Download error: HTTP {audio_response.status_code}")
-                            except Exception as e:
-                                print(f"   Download error: {e}")
-
-                        audio_details.append(detail)
-
-                    # If no music downloaded, error
-                    if not audio_details:
-                        print("   No music could be downloaded")
-                        return {"is_generate": False, "reason": "no_downloadable_audio"}
-
-                    return {"is_generate": True, "data": audio_details}
-                
-                # TEXT_SUCCESS / FIRST_SUCCESS = lyrics ready but music not done yet, continue waiting
-                elif status in ["TEXT_SUCCESS", "FIRST_SUCCESS"]:
-                    print(f"   [{elapsed}s] First stage completed, generating music...")
+                    if status != last_status and status in _INTERIM_OK:
+                        schedule = iter(POLL_SCHEDULE_AFTER_FIRST_STAGE)
+                    last_status = status
+                    
+                except Exception as e:
+                    logger.warning("[%ss] Polling error: %s", elapsed, e)
                     continue
+        finally:
+            _remove_task_waiter(task_id, wake)
+        
+        # Timeout
+        logger.warning("Timeout (%ss)", max_wait)
+        return {"is_generate": False, "reason": "timeout"}
+
+    def _check_record(self, data: Dict[str, Any], elapsed: int, last_status: Optional[str]) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Interprets one record-info response.
+        Returns (status, result) - result stays None while the task is still running.
+        """
+        
+        if not (record := data.get("data")):
+            logger.debug("[%ss] No data, waiting...", elapsed)
+            return last_status, None
+
+        status = record.get("status")
+        
+        # Log if status changed
+        if status != last_status:
+            logger.info("[%ss] Status: %s", elapsed, status)
+
+        # Success states - only SUCCESS means fully complete
+        if status == "SUCCESS":
+            logger.info("Generation completed (%ss)", elapsed)
+            
+            suno_data = record["response"].get("sunoData", [])
+            
+            # Debug: show response structure
+            logger.debug("Suno data count: %d", len(suno_data))
+            if suno_data:
+                logger.debug("First item keys: %s", list(suno_data[0]))
+
+            if not suno_data:
+                logger.warning("Music data empty")
+                return status, {"is_generate": False, "reason": "no_audio_data"}
+
+            audio_details = []
+
+            for idx, audio_feature in enumerate(suno_data):
+                # audioUrl may be in different keys
+                audio_url = _first_present(audio_feature, _AUDIO_URL_KEYS)
+                audio_id = _first_present(audio_feature, _AUDIO_ID_KEYS) or f"unknown_{idx}"
                 
-                # Error states
-                elif status in ["FAILED", "ERROR", "CANCELLED"]:
-                    print(f"   Generation failed: {status}")
-                    return {"is_generate": False, "reason": f"status_{status}"}
+                logger.debug("Item %d: id=%s, url=%.50s", idx, audio_id, audio_url or "EMPTY")
                 
-                # Ongoing states - continue waiting
-                # PENDING, PROCESSING, FIRST_SUCCESS, GENERATING, etc.
+                # If audioUrl empty, this track is not ready yet
+                if not audio_url:
+                    logger.debug("Audio URL empty, skipping: %s", audio_id)
+                    continue
                 
-            except Exception as e:
-                print(f"   [{elapsed}s] Polling error: {e}")
-                continue
+                detail = {
+                    "audio_id": audio_id,
+                    "audio_url": audio_url,
+                    "downloaded": False,
+                    "downloaded_file_path": None
+                }
+
+                audio_details.append(detail)
+
+            # If no music downloaded, error
+            if not audio_details:
+                logger.warning("No music could be downloaded")
+                return status, {"is_generate": False, "reason": "no_downloadable_audio"}
+
+            return status, {"is_generate": True, "data": audio_details}
         
-        # Timeout
-        print(f"   Timeout! ({max_wait}s)")
-        return {"is_generate": False, "reason": "timeout"}
\ No newline at end of file
+        # Error states
+        elif status in _TERMINAL_FAILURES:
+            logger.warning("Generation failed: %s", status)
+            return status, {"is_generate": False, "reason": f"status_{status}"}
+        
+        # TEXT_SUCCESS / FIRST_SUCCESS = lyrics ready but music not done yet, continue waiting
+        elif status in _INTERIM_OK:
+            if status != last_status:
+                logger.info("[%ss] First stage completed, generating music...", elapsed)
+        
+        # Ongoing states - continue waiting
+        # PENDING, PROCESSING, GENERATING, etc.
+        return status, None
+
+    @staticmethod
+    def _mark_if_downloaded(detail: Dict[str, Any], file_path: pathlib.Path) -> bool:
+        """Marks the track as downloaded if a complete local copy already exists."""
+        
+        try:
+            if file_path.stat().st_size < MIN_TRACK_BYTES:
+                return False
+        except FileNotFoundError:
+            return False
+        
+        detail["downloaded"] = True
+        detail["downloaded_file_path"] = str(file_path)
+        return True
+
+    def _download_one(self, detail: Dict[str, Any]) -> Dict[str, Any]:
+        """Downloads a single track to MUSIC_DIR, streaming it to disk."""
+        
+        try:
+            file_path = self.music_dir / f"{detail['audio_id']}.mp3"
+            part_path = file_path.with_suffix(".mp3.part")
+            
+            # Already downloaded by an earlier run / retry
+            if self._mark_if_downloaded(detail, file_path):
+                return detail
+            
+            with self.session.get(
+                detail["audio_url"],
+                headers=DOWNLOAD_HEADERS,
+                stream=True,
+                timeout=DOWNLOAD_TIMEOUT
+            ) as audio_response:
+                audio_response.raise_for_status()
+                
+                # Write to a .part file so an interrupted stream is never mistaken for a finished track
+                fd = _open_track_file(part_path, int(audio_response.headers.get("Content-Length", 0)))
+                try:
+                    written = 0
+                    for chunk in audio_response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        written += _write_all(fd, chunk)
+                    # Drop any preallocated tail if the body was shorter than announced
+                    os.ftruncate(fd, written)
+                finally:
+                    os.close(fd)
+                part_path.replace(file_path)
+
+            detail["downloaded"] = True
+            detail["downloaded_file_path"] = str(file_path)
+            logger.info("Downloaded: %s", file_path)
+        except Exception as e:
+            logger.warning("Download error: %s", e)
+        
+        return detail
+
+    async def _adownload_one(self, detail: Dict[str, Any]) -> Dict[str, Any]:
+        """Async _download_one - streams the track through the shared AsyncClient."""
+        
+        try:
+            file_path = self.music_dir / f"{detail['audio_id']}.mp3"
+            part_path = file_path.with_suffix(".mp3.part")
+            
+            # Already downloaded by an earlier run / retry
+            if self._mark_if_downloaded(detail, file_path):
+                return detail
+            
+            # Same behaviour as the requests session: follow CDN redirects and
+            # retry 429 / 5xx with backoff (failed connects are retried by the transport)
+            for attempt in range(API_STATUS_RETRIES + 1):
+                async with self._get_aclient().stream(
+                    "GET",
+                    detail["audio_url"],
+                    headers=DOWNLOAD_HEADERS,
+                    timeout=httpx.Timeout(DOWNLOAD_TIMEOUT[1], connect=DOWNLOAD_TIMEOUT[0]),
+                    follow_redirects=True
+                ) as audio_response:
+                    if audio_response.status_code not in RETRY_STATUSES or attempt == API_STATUS_RETRIES:
+                        audio_response.raise_for_status()
+                        
+                        # Local chunk writes are short enough to do on the loop thread
+                        fd = _open_track_file(part_path, int(audio_response.headers.get("Content-Length", 0)))
+                        try:
+                            written = 0
+                            async for chunk in audio_response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                                written += _write_all(fd, chunk)
+                            os.ftruncate(fd, written)
+                        finally:
+                            os.close(fd)
+                        part_path.replace(file_path)
+                        break
+                await asyncio.sleep(API_BACKOFF * 2 ** attempt)
+
+            detail["downloaded"] = True
+            detail["downloaded_file_path"] = str(file_path)
+            logger.info("Downloaded: %s", file_path)
+        except Exception as e:
+            logger.warning("Download error: %s", e)
+        
+        return detail
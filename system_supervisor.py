@@ -12,12 +12,18 @@ Flow:
 5. cover_generator: Generates cover
 6. video_generator: Generates video
 7. delivery_agent: Delivers results
+
+LLM / API heavy nodes are async, so the workflow is run with ainvoke().
 """
 
 import os
-import time
+import asyncio
+import uuid
+import logging
 from typing import Literal
-from langchain_openai import ChatOpenAI
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_core.caches import InMemoryCache
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain.prompts import ChatPromptTemplate
 from langgraph.graph import StateGraph, END
 from langgraph.checkpoint.memory import MemorySaver
@@ -33,56 +39,88 @@ from base_models import (
     ImagePromptBaseModel,
     DeliveryDecisionBaseModel
 )
-from whatsapp_helper import WhatsApp
+from whatsapp_helper import WhatsApp, HTTP_POOL_SIZE
 from personadb_utils import PersonaDB
 from suno_ai import SunoAPI
 from cover_generator import ImageGeneratorAgent, GoogleApi
+from music_param_store import MusicParamStore, NUMPY_AVAILABLE
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
 
-def messages_to_string(messages: list, last_n: int = 10) -> str:
-    """
-    Converts message list to string.
-    Can be HumanMessage, AIMessage or string.
-    """
-    result = []
-    for msg in messages[-last_n:]:
-        if isinstance(msg, str):
-            result.append(msg)
-        elif hasattr(msg, 'content'):
-            role = msg.__class__.__name__.replace("Message", "")
-            result.append(f"{role}: {msg.content}")
-        else:
-            result.append(str(msg))
-    return "\n".join(result)
+# Lyrics and remakes use the full model; routing, planning and the cover
+# prompt are tightly constrained schemas and use the faster one
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o")
+LLM_FAST_MODEL = os.getenv("LLM_FAST_MODEL", "gpt-4o-mini")
 
+# OpenAI service tier for communication_agent, which answers every message
+# (e.g. "priority"); unset keeps the account default
+COMMUNICATION_SERVICE_TIER = os.getenv("COMMUNICATION_SERVICE_TIER") or None
 
-class SystemSupervisor:
-    """
-    Main supervisor that manages the entire system.
-    Coordinates all agents within a single workflow.
-    """
+# Requests this similar (cosine) to an earlier successful one in the same
+# conversation reuse its Suno parameters instead of calling the music LLM;
+# needs numpy, 1 or more disables it
+MUSIC_PARAM_MATCH_THRESHOLD = float(os.getenv("MUSIC_PARAM_MATCH_THRESHOLD", "0.95"))
+MUSIC_PARAM_STORE_PATH = "artifacts/databases/music_params.npz"
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
 
-    def __init__(self):
-        self.llm = ChatOpenAI(model="gpt-4o")
-        self.message_helper = WhatsApp()
-        self.persona_db = PersonaDB()
-        self.suno_api = SunoAPI()
-        self.google_api = GoogleApi()
-        self.memory = MemorySaver()
-        self.workflow = None
+# Exact-match response cache for the planner and cover calls. Their inputs
+# are a few short fields that repeat on retries and re-entries. Music and
+# remake calls must vary on "regenerate", and communication_agent sees the
+# whole transcript, so neither is cached.
+LLM_CACHE_SIZE = 512
 
-    # ================================================================
-    # COMMUNICATION LAYER
-    # ================================================================
+# The video is one still frame over the track: encode it at 1 fps, and keep
+# audio that is already AAC instead of re-encoding it
+VIDEO_FRAMERATE = "1"
+AAC_AUDIO_EXTENSIONS = {".m4a", ".mp4", ".aac"}
 
-    def communication_agent(self, state: UnifiedState):
-        """
-        Main communication agent - analyzes user message and determines action.
-        """
-        
-        system_message = """You are the intelligent assistant of a music production company.
+# Sent when communication_agent gets no usable decision from the model
+COMMUNICATION_FALLBACK_MESSAGE = "Sorry, I couldn't quite get that. Could you tell me again what you'd like?"
+
+# Suno attempts per music request; waits MUSIC_RETRY_BACKOFF, doubling, between them
+MUSIC_GENERATION_ATTEMPTS = 2
+MUSIC_RETRY_BACKOFF = 2.0
+
+# Last line of the delivery message
+DELIVERY_CLOSING = "All content is ready! Would you like anything else?"
+DELIVERY_CLOSING_EMPTY = "Hmm, couldn't find content to send. What would you like me to do?"
+
+# WhatsApp sends in flight at once (one per pooled Evolution API connection)
+WHATSAPP_CONCURRENCY = HTTP_POOL_SIZE
+
+# Output folders for generated covers and videos
+IMAGES_DIR = "artifacts/generated_images"
+VIDEOS_DIR = "artifacts/final_videos"
+
+# Concurrent FFmpeg encodes; each one is CPU-bound in libx264
+VIDEO_ENCODE_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+
+class PromptCacheLogger(BaseCallbackHandler):
+    """Debug-logs how many prompt tokens OpenAI served from its prompt cache"""
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    logger.debug(
+                        "Prompt tokens: %s (cached: %s)",
+                        usage.get("input_tokens"),
+                        usage.get("input_token_details", {}).get("cache_read", 0)
+                    )
+
+
+# ================================================================
+# PROMPTS (parsed once at import)
+# ================================================================
+# System messages hold no {placeholders}: every call sends the same bytes
+# first, so OpenAI prompt caching can reuse the prefix. Per-turn state goes
+# into the human message.
+
+COMMUNICATION_SYSTEM_MESSAGE = """You are the intelligent assistant of a music production company.
 You communicate with users via WhatsApp.
 
 # TASKS:
@@ -100,15 +138,6 @@ You communicate with users via WhatsApp.
 - **wait_user**: Wait for user response
 - **finish**: End conversation
 
-# CURRENT STATUS:
-- Stage: {current_stage}
-- Music generated: {is_music_generated}
-- Music selected: {is_music_selected}
-- Cover generated: {is_cover_generated}
-- Video generated: {is_video_generated}
-- Task queue: {task_queue}
-- Completed tasks: {completed_tasks}
-
 # DECISION LOGIC:
 1. User wants something new → task_planner
 2. Music ready but not sent → send_music
@@ -124,8 +153,17 @@ You communicate with users via WhatsApp.
 - If ERROR and retry count reached 2, DON'T go to task_planner, apologize to user and go to wait_user
 - Don't keep going to task_planner for the same task (creates error loop)
 """
-        
-        human_message = """
+
+COMMUNICATION_HUMAN_MESSAGE = """
+# CURRENT STATUS:
+- Stage: {current_stage}
+- Music generated: {is_music_generated}
+- Music selected: {is_music_selected}
+- Cover generated: {is_cover_generated}
+- Video generated: {is_video_generated}
+- Task queue: {task_queue}
+- Completed tasks: {completed_tasks}
+
 # Recent Messages:
 {messages}
 
@@ -135,35 +173,309 @@ You communicate with users via WhatsApp.
 Analyze the situation and determine action.
 """
 
-        template = ChatPromptTemplate.from_messages([
-            ("system", system_message),
-            ("human", human_message)
-        ])
+COMMUNICATION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", COMMUNICATION_SYSTEM_MESSAGE),
+    ("human", COMMUNICATION_HUMAN_MESSAGE)
+])
+
+
+TASK_PLANNER_SYSTEM_MESSAGE = """You are a music production planner.
+Analyze user request and determine which tasks to perform.
 
-        chain = template | self.llm.with_structured_output(CommunicationDecisionBaseModel)
+# TASKS:
+- **music**: Generate new music
+- **cover**: Generate album/song cover
+- **video**: Create music video (music + cover combination)
+- **persona_save**: Save current music's style
+- **remake**: Regenerate/edit current music
 
+# RULES:
+1. Video requires both music AND cover first
+2. Remake requires music to be generated first
+3. Saving persona requires a selected music
+4. Order tasks logically: music → cover → video
+
+Plan tasks according to user request.
+"""
+
+TASK_PLANNER_HUMAN_MESSAGE = """
+# CURRENT STATUS:
+- Has music: {has_music}
+- Has selected music: {has_selected_music}
+- Has cover: {has_cover}
+
+User request: {user_request}
+
+Recent messages:
+{recent_messages}
+
+Plan tasks and prepare an informative message for user.
+"""
+
+TASK_PLANNER_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", TASK_PLANNER_SYSTEM_MESSAGE),
+    ("human", TASK_PLANNER_HUMAN_MESSAGE)
+])
+
+
+MUSIC_GENERATOR_SYSTEM_MESSAGE = """You are a professional music creation expert.
+
+# RULES:
+- custom_mode: True (for advanced settings)
+- instrumental: True for instrumental, False for vocals
+- prompt: Lyrics (max 3000 chars) - Write lyrics if with vocals
+- style: Music style (max 200 chars)
+- title: Title (max 80 chars)
+- All instructions in ENGLISH, only lyrics in requested language
+
+# IMPORTANT:
+- Pay attention to rhymes when writing lyrics
+- Be minimalist but impactful
+- Specify unwanted elements with negative_tags
+"""
+
+MUSIC_GENERATOR_HUMAN_MESSAGE = """
+Music request: {music_description}
+
+Create detailed music parameters for this request.
+"""
+
+MUSIC_GENERATOR_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", MUSIC_GENERATOR_SYSTEM_MESSAGE),
+    ("human", MUSIC_GENERATOR_HUMAN_MESSAGE)
+])
+
+
+MUSIC_REMAKE_SYSTEM_MESSAGE = """Edit existing music based on user feedback.
+Keep original style but apply requested changes."""
+
+MUSIC_REMAKE_HUMAN_MESSAGE = """
+Original style: {original_style}
+Original title: {original_title}
+User feedback: {feedback}
+
+Create new music parameters.
+"""
+
+MUSIC_REMAKE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", MUSIC_REMAKE_SYSTEM_MESSAGE),
+    ("human", MUSIC_REMAKE_HUMAN_MESSAGE)
+])
+
+
+COVER_SYSTEM_MESSAGE = """You are a music cover art creation expert.
+        
+# RULES:
+- Minimalist and impactful designs
+- Visuals that reflect the music's soul
+- Avoid excessive detail and complexity
+- Prompt should be in ENGLISH
+- Don't add text to cover (unless requested)
+"""
+
+COVER_HUMAN_MESSAGE = """
+Music style: {music_style}
+Music title: {music_title}
+Additional description: {cover_description}
+
+Create an impactful cover design prompt for this music.
+"""
+
+COVER_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", COVER_SYSTEM_MESSAGE),
+    ("human", COVER_HUMAN_MESSAGE)
+])
+
+
+def local_file_url(file_path: str, kind: str) -> str:
+    """Fallback link served by the local Flask /files/<kind>/ route"""
+    return f"http://localhost:5000/files/{kind}/{os.path.basename(file_path)}"
+
+
+def messages_to_string(messages: list, last_n: int = 10) -> str:
+    """
+    Converts message list to string.
+    Can be HumanMessage, AIMessage or string.
+    """
+    return "\n".join(map(_render_message, messages[-last_n:]))
+
+
+def _render_message(msg) -> str:
+    """Renders one message; nodes store pre-rendered "Role: text" strings"""
+    if type(msg) is str:
+        return msg
+    if hasattr(msg, 'content'):
+        role = msg.__class__.__name__.replace("Message", "")
+        return f"{role}: {msg.content}"
+    return str(msg)
+
+
+class SystemSupervisor:
+    """
+    Main supervisor that manages the entire system.
+    Coordinates all agents within a single workflow.
+    """
+
+    # Node that starts each planned task
+    FIRST_TASK_TO_NODE = {
+        "music": "music_generator",
+        "cover": "cover_generator",
+        "video": "video_generator",
+        "remake": "music_remake"
+    }
+
+    # Graph nodes, grouped by layer
+    GRAPH_NODES = (
+        # Communication
+        "communication_agent", "send_message", "wait_user", "choice_persona",
+        "send_music", "send_cover", "send_video",
+        # Task planning
+        "task_planner",
+        # Music generation
+        "music_generator", "music_selection_prompt", "music_selection_handler", "music_remake",
+        # Cover, video, delivery
+        "cover_generator", "video_generator", "delivery_agent",
+        "finish"
+    )
+
+    # Deliverables in message order: (name, ready flag, path key, /files/ kind, line template)
+    DELIVERY_SPEC = (
+        ("music", "is_music_selected", "selected_audio_file_path", "music", "Your selected music:\n%s"),
+        ("cover", "is_cover_generated", "cover_image_path", "image", "Album cover:\n%s"),
+        ("video", "is_video_generated", "video_file_path", "video", "Your music video:\n%s")
+    )
+
+    # send_music / send_cover / send_video: kind -> (path key, WhatsApp helper method, label)
+    MEDIA_SPEC = {
+        "music": ("selected_audio_file_path", "send_audio", "Music"),
+        "cover": ("cover_image_path", "send_image", "Cover"),
+        "video": ("video_file_path", "send_video", "Video")
+    }
+
+    # Exact replies that pick one of the two tracks (0-based index)
+    SELECTION_REPLIES = {
+        "1": 0, "one": 0, "first": 0,
+        "2": 1, "two": 1, "second": 1
+    }
+
+    def __init__(self, checkpointer=None):
+        # Response cache for the planner and cover calls (see LLM_CACHE_SIZE)
+        llm_cache = InMemoryCache(maxsize=LLM_CACHE_SIZE)
+        usage_log = [PromptCacheLogger()]
+        self.llm = ChatOpenAI(model=LLM_MODEL, callbacks=usage_log)
+        self.llm_fast = ChatOpenAI(model=LLM_FAST_MODEL, temperature=0, service_tier=COMMUNICATION_SERVICE_TIER, callbacks=usage_log)
+        self.cached_llm_fast = ChatOpenAI(model=LLM_FAST_MODEL, temperature=0, cache=llm_cache, callbacks=usage_log)
+        self.message_helper = WhatsApp()
+        self.persona_db = PersonaDB()
+        self.suno_api = SunoAPI()
+        self.google_api = GoogleApi()
+        # Conversation checkpoints; in-memory unless a durable saver is passed in
+        self.memory = checkpointer or MemorySaver()
+        self.workflow = None
+        
+        # Set by the webhook server to build public links; see file_url()
+        self.get_file_url = None
+        
+        # Bounds concurrent WhatsApp calls to the Evolution connection pool size
+        self._whatsapp_slots = asyncio.Semaphore(WHATSAPP_CONCURRENCY)
+        
+        # Speculative work and media uploads started by nodes; kept referenced until they finish
+        self._background_tasks = set()
+        
+        # Created once here instead of on every cover/video call
+        for directory in (IMAGES_DIR, VIDEOS_DIR):
+            os.makedirs(directory, exist_ok=True)
+        
+        # Caps concurrent FFmpeg processes; each encode runs as an async subprocess
+        self._encode_slots = asyncio.Semaphore(VIDEO_ENCODE_WORKERS)
+        
+        # Last formatted persona list, keyed by the (name, description) pairs it shows
+        self._persona_message: tuple = (None, "")
+        
+        # Past music requests and their parameters (None when disabled)
+        if NUMPY_AVAILABLE and MUSIC_PARAM_MATCH_THRESHOLD < 1:
+            self.embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+            self.music_param_store = MusicParamStore(MUSIC_PARAM_STORE_PATH, threshold=MUSIC_PARAM_MATCH_THRESHOLD)
+        else:
+            self.embeddings = None
+            self.music_param_store = None
+        
+        # Structured-output chains are built once and reused on every turn
+        self._communication_chain = COMMUNICATION_PROMPT | self.llm_fast.with_structured_output(CommunicationDecisionBaseModel)
+        self._task_planner_chain = TASK_PLANNER_PROMPT | self.cached_llm_fast.with_structured_output(TaskPlannerDecisionBaseModel)
+        # Music and remake parameters are never cached: "regenerate" re-sends the same
+        # description and must get a fresh answer
+        self._music_chain = MUSIC_GENERATOR_PROMPT | self.llm.with_structured_output(MusicBaseModel)
+        self._remake_chain = MUSIC_REMAKE_PROMPT | self.llm.with_structured_output(MusicBaseModel)
+        self._cover_chain = COVER_PROMPT | self.cached_llm_fast.with_structured_output(ImagePromptBaseModel)
+
+    def file_url(self, file_path: str, kind: str) -> str:
+        """Link for a generated file (the hook decides whether and how long links are reused)"""
+        return self._url_for(file_path, kind)
+
+    @property
+    def get_file_url(self):
+        return self._get_file_url
+
+    @get_file_url.setter
+    def get_file_url(self, hook):
+        """Binds the link builder once per hook"""
+        self._get_file_url = hook
+        self._url_for = (lambda file_path, kind: hook(file_path)) if hook else local_file_url
+
+    async def _whatsapp(self, send, *args):
+        """Runs a blocking WhatsApp helper call in a thread, at most WHATSAPP_CONCURRENCY at once"""
+        async with self._whatsapp_slots:
+            return await asyncio.to_thread(send, *args)
+
+    def _run_in_background(self, coro):
+        """Schedules a coroutine on the running loop without waiting for it"""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_task_done)
+
+    async def wait_background_tasks(self):
+        """Waits for pending background work (e.g. media uploads) before shutdown"""
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+
+    def _background_task_done(self, task):
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.warning("Background task failed: %s", task.exception())
+
+    # ================================================================
+    # COMMUNICATION LAYER
+    # ================================================================
+
+    async def communication_agent(self, state: UnifiedState):
+        """
+        Main communication agent - analyzes user message and determines action.
+        """
+        
         error_info = "None"
         if state.get("error_message"):
-            retry = state.get("retry_count", 0)
-            error_info = f"Error: {state['error_message']} (Attempt: {retry}/2)"
-
-        result = chain.invoke({
-            "messages": messages_to_string(state.get("messages", [])),
-            "current_stage": state.get("current_stage", "idle"),
-            "is_music_generated": state.get("is_music_generated", False),
-            "is_music_selected": state.get("is_music_selected", False),
-            "is_cover_generated": state.get("is_cover_generated", False),
-            "is_video_generated": state.get("is_video_generated", False),
-            "task_queue": state.get("task_queue", []),
-            "completed_tasks": state.get("completed_tasks", []),
-            "error_info": error_info
-        })
+            error_info = f"Error: {state['error_message']} (stage: {state.get('last_error_stage', 'unknown')})"
 
-        print(f"\n{'='*50}")
-        print(f"COMMUNICATION AGENT")
-        print(f"   Action: {result.action}")
-        print(f"   Description: {result.description[:100]}...")
-        print(f"{'='*50}\n")
+        try:
+            result = await self._communication_chain.ainvoke({
+                "messages": messages_to_string(state.get("messages", [])),
+                "current_stage": state.get("current_stage", "idle"),
+                "is_music_generated": state.get("is_music_generated", False),
+                "is_music_selected": state.get("is_music_selected", False),
+                "is_cover_generated": state.get("is_cover_generated", False),
+                "is_video_generated": state.get("is_video_generated", False),
+                "task_queue": state.get("task_queue", []),
+                "completed_tasks": state.get("completed_tasks", []),
+                "error_info": error_info
+            })
+        except Exception as e:
+            # No usable decision (refusal, malformed output, API error): ask the user
+            # instead of crashing the graph or spending another call on a re-plan
+            logger.warning("Communication decision failed: %s", e)
+            result = CommunicationDecisionBaseModel(action="send_message", description=COMMUNICATION_FALLBACK_MESSAGE)
+
+        logger.info("Communication agent: action=%s description=%.100s", result.action, result.description)
 
         return Command(
             update={
@@ -173,15 +485,15 @@ Analyze the situation and determine action.
             goto=result.action
         )
 
-    def send_message(self, state: UnifiedState):
+    async def send_message(self, state: UnifiedState):
         """Sends message to user"""
         
         message = state.get("communication_description", "")
         phone = state["phone_number"]
         
         try:
-            self.message_helper.send_message(phone, message)
-            print(f"Message sent: {phone}")
+            await self._whatsapp(self.message_helper.send_message, phone, message)
+            logger.info("Message sent: %s", phone)
             
             return Command(
                 update={
@@ -190,7 +502,7 @@ Analyze the situation and determine action.
                 goto="wait_user"
             )
         except Exception as e:
-            print(f"Message error: {e}")
+            logger.warning("Message error: %s", e)
             return Command(
                 update={
                     "messages": [f"System: Message could not be sent - {e}"],
@@ -202,11 +514,11 @@ Analyze the situation and determine action.
     def wait_user(self, state: UnifiedState):
         """Human-in-the-loop: Waits for user response"""
         
-        print("\nWaiting for user response...")
+        logger.info("Waiting for user response")
         
         user_response = interrupt("Waiting for user response...")
         
-        print(f"User response received: {user_response}")
+        logger.info("User response received: %s", user_response)
         
         return Command(
             update={
@@ -216,29 +528,33 @@ Analyze the situation and determine action.
             goto="communication_agent"
         )
 
-    def choice_persona(self, state: UnifiedState):
+    async def choice_persona(self, state: UnifiedState):
         """Persona selection"""
         
         phone = state["phone_number"]
-        personas = self.persona_db.list_personas()
+        personas = await asyncio.to_thread(self.persona_db.list_personas)
         
         if not personas:
             message = "No personas saved yet. First, generate music and save a style you like!"
-            self.message_helper.send_message(phone, message)
+            await self._whatsapp(self.message_helper.send_message, phone, message)
             
             return Command(
                 update={"messages": [f"Assistant: {message}"]},
                 goto="wait_user"
             )
         
-        # Format persona list
-        message = "Saved Personas:\n\n"
-        for idx, persona in enumerate(personas, 1):
-            message += f"{idx}. {persona['name']}\n"
-            message += f"   {persona.get('description', 'No description')}\n\n"
-        message += "\nWhich persona would you like to use? (Send number)"
+        # Format persona list (reused while the catalog is unchanged)
+        key = tuple((p['name'], p.get('description', 'No description')) for p in personas)
+        if self._persona_message[0] != key:
+            message = "".join([
+                "Saved Personas:\n\n",
+                *(f"{idx}. {name}\n   {description}\n\n" for idx, (name, description) in enumerate(key, 1)),
+                "\nWhich persona would you like to use? (Send number)"
+            ])
+            self._persona_message = (key, message)
+        message = self._persona_message[1]
         
-        self.message_helper.send_message(phone, message)
+        await self._whatsapp(self.message_helper.send_message, phone, message)
         
         return Command(
             update={
@@ -252,52 +568,12 @@ Analyze the situation and determine action.
     # TASK PLANNING LAYER
     # ================================================================
 
-    def task_planner(self, state: UnifiedState):
+    async def task_planner(self, state: UnifiedState):
         """
         Task planner - analyzes user request and determines tasks to perform.
         """
         
-        system_message = """You are a music production planner.
-Analyze user request and determine which tasks to perform.
-
-# TASKS:
-- **music**: Generate new music
-- **cover**: Generate album/song cover
-- **video**: Create music video (music + cover combination)
-- **persona_save**: Save current music's style
-- **remake**: Regenerate/edit current music
-
-# RULES:
-1. Video requires both music AND cover first
-2. Remake requires music to be generated first
-3. Saving persona requires a selected music
-4. Order tasks logically: music → cover → video
-
-# CURRENT STATUS:
-- Has music: {has_music}
-- Has selected music: {has_selected_music}
-- Has cover: {has_cover}
-
-Plan tasks according to user request.
-"""
-
-        human_message = """
-User request: {user_request}
-
-Recent messages:
-{recent_messages}
-
-Plan tasks and prepare an informative message for user.
-"""
-
-        template = ChatPromptTemplate.from_messages([
-            ("system", system_message),
-            ("human", human_message)
-        ])
-
-        chain = template | self.llm.with_structured_output(TaskPlannerDecisionBaseModel)
-
-        result = chain.invoke({
+        result = await self._task_planner_chain.ainvoke({
             "user_request": state.get("user_request", ""),
             "recent_messages": messages_to_string(state.get("messages", []), last_n=5),
             "has_music": state.get("is_music_generated", False),
@@ -305,29 +581,17 @@ Plan tasks and prepare an informative message for user.
             "has_cover": state.get("is_cover_generated", False)
         })
 
-        print(f"\n{'='*50}")
-        print(f"TASK PLANNER")
-        print(f"   Tasks: {result.tasks}")
-        print(f"   Music desc: {result.music_description}")
-        print(f"   Cover desc: {result.cover_description}")
-        print(f"{'='*50}\n")
+        logger.info("Task planner: tasks=%s", result.tasks)
+        logger.debug("Task planner: music=%s cover=%s", result.music_description, result.cover_description)
 
         # Inform user
         phone = state["phone_number"]
-        self.message_helper.send_message(phone, result.response_to_user)
+        await self._whatsapp(self.message_helper.send_message, phone, result.response_to_user)
 
         # Determine first task
         next_node = "communication_agent"
         if result.tasks:
-            first_task = result.tasks[0]
-            if first_task == "music":
-                next_node = "music_generator"
-            elif first_task == "cover":
-                next_node = "cover_generator"
-            elif first_task == "video":
-                next_node = "video_generator"
-            elif first_task == "remake":
-                next_node = "music_remake"
+            next_node = self.FIRST_TASK_TO_NODE.get(result.tasks[0], "communication_agent")
 
         return Command(
             update={
@@ -345,105 +609,57 @@ Plan tasks and prepare an informative message for user.
     # MUSIC GENERATION LAYER
     # ================================================================
 
-    def music_generator(self, state: UnifiedState):
+    async def music_generator(self, state: UnifiedState):
         """Generates music - Uses Suno API"""
         
-        print("\nMUSIC GENERATOR started...")
+        logger.info("Music generator started")
         
-        # Retry control - max 2 attempts
-        retry_count = state.get("retry_count", 0)
-        if retry_count >= 2:
-            print(f"   Max retry count reached ({retry_count})")
-            
-            # Send error message to user
-            phone = state["phone_number"]
-            self.message_helper.send_message(
-                phone,
-                "Having trouble with music generation. Please try again later or make a different request."
-            )
-            
-            return Command(
-                update={
-                    "error_message": "Max retry exceeded",
-                    "current_stage": "idle",
-                    "retry_count": 0,
-                    "task_queue": [],
-                    "messages": ["System: Music generation failed - max retry"]
-                },
-                goto="wait_user"
-            )
-        
-        system_message = """You are a professional music creation expert.
-
-# RULES:
-- custom_mode: True (for advanced settings)
-- instrumental: True for instrumental, False for vocals
-- prompt: Lyrics (max 3000 chars) - Write lyrics if with vocals
-- style: Music style (max 200 chars)
-- title: Title (max 80 chars)
-- All instructions in ENGLISH, only lyrics in requested language
-
-# IMPORTANT:
-- Pay attention to rhymes when writing lyrics
-- Be minimalist but impactful
-- Specify unwanted elements with negative_tags
-"""
-
-        human_message = """
-Music request: {music_description}
-
-Create detailed music parameters for this request.
-"""
-
-        template = ChatPromptTemplate.from_messages([
-            ("system", system_message),
-            ("human", human_message)
-        ])
-
-        chain = template | self.llm.with_structured_output(MusicBaseModel)
-
-        music_params = chain.invoke({
-            "music_description": state.get("music_prompt", state.get("user_request", ""))
-        })
+        # "neither/regenerate" comes back here with the same description: it must
+        # not get the previous parameters again, and it is not remembered either
+        music_params, request_embedding = await self._music_params_for(
+            state["phone_number"],
+            state.get("music_prompt", state.get("user_request", "")),
+            reuse=not state.get("is_remake_requested", False)
+        )
 
-        print(f"   Style: {music_params.style}")
-        print(f"   Title: {music_params.title}")
-        print(f"   Instrumental: {music_params.instrumental}")
+        logger.debug(
+            "Music params: style=%s title=%s instrumental=%s",
+            music_params.style, music_params.title, music_params.instrumental
+        )
 
-        # Call Suno API
-        api_result = self.suno_api.create_music(state, music_params)
+        # Call Suno API; a queued cover only needs style/title, so it renders meanwhile
+        if "cover" in state.get("task_queue", []):
+            api_result, cover = await asyncio.gather(
+                self._create_music_with_retry(state, music_params),
+                self._prefetch_cover(music_params.style, music_params.title, state.get("cover_description", ""))
+            )
+        else:
+            api_result = await self._create_music_with_retry(state, music_params)
+            cover = {}
 
         if api_result["is_generated"]:
             updated_state = api_result["current_state"]
             
-            # Filter None values
-            audio_paths = [p for p in updated_state.get("generated_audio_file_adress", []) if p]
+            # SunoAPI only returns tracks that were downloaded
+            audio_paths = updated_state.get("generated_audio_file_paths", [])
             audio_ids = updated_state.get("generated_audio_ids", [])
             audio_urls = updated_state.get("generated_audio_urls", [])
             
-            print(f"   Music generated!")
-            print(f"   Audio IDs: {audio_ids}")
-            print(f"   Downloaded paths: {audio_paths}")
-            
-            # If no music downloaded, error
-            if not audio_paths:
-                print("   Music could not be downloaded!")
-                return Command(
-                    update={
-                        "error_message": "Music could not be downloaded",
-                        "last_error_stage": "music_generator",
-                        "retry_count": retry_count + 1,
-                        "messages": [f"System: Music download failed (attempt {retry_count + 1})"]
-                    },
-                    goto="communication_agent"
-                )
+            logger.info("Music generated: ids=%s", audio_ids)
+            if request_embedding is not None:
+                self.music_param_store.add(state["phone_number"], request_embedding, music_params.model_dump())
+            logger.debug("Downloaded paths: %s", audio_paths)
             
             # Update task queue
             remaining_tasks = state.get("task_queue", [])[1:]
             completed = state.get("completed_tasks", []) + ["music"]
+            if cover:
+                remaining_tasks = [t for t in remaining_tasks if t != "cover"]
+                completed.append("cover")
             
             return Command(
                 update={
+                    **cover,
                     "current_stage": "awaiting_music_selection",
                     "is_music_generated": True,
                     "generated_audio_ids": audio_ids,
@@ -454,36 +670,87 @@ Create detailed music parameters for this request.
                     "task_queue": remaining_tasks,
                     "completed_tasks": completed,
                     "retry_count": 0,
+                    "is_remake_requested": False,
                     "messages": [f"System: {len(audio_paths)} music tracks generated, awaiting selection"]
                 },
                 goto="music_selection_prompt"
             )
         else:
-            print(f"   Music could not be generated!")
+            logger.warning("Music could not be generated after %d attempts", MUSIC_GENERATION_ATTEMPTS)
+            
+            # Send error message to user
+            phone = state["phone_number"]
+            await self._whatsapp(
+                self.message_helper.send_message,
+                phone,
+                "Having trouble with music generation. Please try again later or make a different request."
+            )
+            
             return Command(
                 update={
                     "error_message": api_result.get("error", "Music could not be generated"),
                     "last_error_stage": "music_generator",
-                    "retry_count": retry_count + 1,
-                    "messages": [f"System: Music generation error (attempt {retry_count + 1})"]
+                    "current_stage": "idle",
+                    "retry_count": 0,
+                    "task_queue": [],
+                    "is_remake_requested": False,
+                    "messages": ["System: Music generation failed - max retry"]
                 },
-                goto="communication_agent"
+                goto="wait_user"
             )
 
-    def music_selection_prompt(self, state: UnifiedState):
+    async def _music_params_for(self, thread_id: str, music_description: str, reuse: bool = True):
+        """
+        Suno parameters for a request and its embedding (None when reused, not embedded or reuse is off).
+        Only this conversation's earlier requests are reused - their lyrics and title are that user's.
+        """
+        if reuse and self.music_param_store is not None:
+            try:
+                embedding = await self.embeddings.aembed_query(music_description)
+            except Exception as e:
+                logger.warning("Music request embedding failed: %s", e)
+                embedding = None
+            
+            if embedding is not None:
+                payload = self.music_param_store.match(thread_id, embedding)
+                if payload:
+                    logger.info("Reusing music parameters of a similar request")
+                    return MusicBaseModel(**payload), None
+        else:
+            embedding = None
+        
+        music_params = await self._music_chain.ainvoke({"music_description": music_description})
+        return music_params, embedding
+
+    async def _create_music_with_retry(self, state: UnifiedState, music_params) -> dict:
+        """Suno generation, retried here with backoff instead of re-planning through communication_agent"""
+        for attempt in range(1, MUSIC_GENERATION_ATTEMPTS + 1):
+            api_result = await self.suno_api.acreate_music(state, music_params)
+            
+            # A task can finish without any downloadable track
+            if api_result["is_generated"] and not api_result["current_state"].get("generated_audio_file_paths"):
+                api_result = {**api_result, "is_generated": False, "error": "Music could not be downloaded"}
+            if api_result["is_generated"]:
+                return api_result
+            
+            logger.warning("Music attempt %d/%d failed: %s", attempt, MUSIC_GENERATION_ATTEMPTS, api_result.get("error"))
+            if attempt < MUSIC_GENERATION_ATTEMPTS:
+                await asyncio.sleep(MUSIC_RETRY_BACKOFF * 2 ** (attempt - 1))
+        
+        return api_result
+
+    async def music_selection_prompt(self, state: UnifiedState):
         """Sends 2 music tracks as links to user and asks for selection"""
         
         phone = state["phone_number"]
         audio_paths = state.get("generated_audio_file_paths", [])
         
-        # Filter None values
-        audio_paths = [p for p in audio_paths if p]
-        
-        print(f"\nMUSIC SELECTION - Sending {len(audio_paths)} music links...")
+        logger.info("Music selection: sending %d music links", len(audio_paths))
         
         if not audio_paths:
-            print("   No downloaded music!")
-            self.message_helper.send_message(
+            logger.warning("No downloaded music")
+            await self._whatsapp(
+                self.message_helper.send_message,
                 phone,
                 "Music could not be downloaded. Should we try again?"
             )
@@ -503,25 +770,31 @@ Create detailed music parameters for this request.
         message += "- 'neither' - Regenerate\n"
         message += "- Write feedback - Tell me what to change"
         
-        self.message_helper.send_message(phone, message)
-        time.sleep(1)
+        # Built off the event loop: the link hook may upload the file first
+        file_urls = await asyncio.gather(
+            *(asyncio.to_thread(self.file_url, audio_path, "music") for audio_path in audio_paths[:2]),
+            return_exceptions=True
+        )
         
-        # Send music links as SEPARATE messages (for clickability)
-        for idx, audio_path in enumerate(audio_paths[:2], 1):
-            try:
-                if hasattr(self, 'get_file_url') and self.get_file_url:
-                    file_url = self.get_file_url(audio_path)
-                else:
-                    filename = os.path.basename(audio_path)
-                    file_url = f"http://localhost:5000/files/music/{filename}"
-                
-                link_message = f"Version {idx}:\n{file_url}"
-                self.message_helper.send_message(phone, link_message)
-                time.sleep(2)
-                
-                print(f"   Music {idx} link sent: {file_url}")
-            except Exception as e:
-                print(f"   Music {idx} link could not be sent: {e}")
+        # Links go on their own lines in the same message (still clickable)
+        for idx, file_url in enumerate(file_urls, 1):
+            if isinstance(file_url, Exception):
+                logger.warning("Music %d link could not be built: %s", idx, file_url)
+                continue
+            
+            message += f"\n\nVersion {idx}:\n{file_url}"
+            logger.debug("Music %d link: %s", idx, file_url)
+        
+        await self._whatsapp(self.message_helper.send_message, phone, message)
+        
+        # The cover prompt is the same whichever track gets picked: request it
+        # while the user decides so cover_generator finds it in the LLM cache
+        if "cover" in state.get("task_queue", []):
+            self._run_in_background(self._cover_chain.ainvoke({
+                "music_style": state.get("music_style", ""),
+                "music_title": state.get("music_title", ""),
+                "cover_description": state.get("cover_description", "")
+            }))
         
         return Command(
             update={
@@ -534,11 +807,11 @@ Create detailed music parameters for this request.
     def music_selection_handler(self, state: UnifiedState):
         """Waits for and processes user's music selection"""
         
-        print("\nWaiting for music selection...")
+        logger.info("Waiting for music selection")
         
         user_response = interrupt("Waiting for music selection...")
         
-        print(f"User response: {user_response}")
+        logger.info("User response: %s", user_response)
         
         # Analyze response
         response_lower = user_response.lower().strip()
@@ -551,13 +824,9 @@ Create detailed music parameters for this request.
         next_node = "communication_agent"
         updates = {"messages": [f"User: {user_response}"]}
         
-        if response_lower in ["1", "one", "first"]:
-            selected_index = 0
-            updates["messages"].append("System: First music selected")
-            
-        elif response_lower in ["2", "two", "second"]:
-            selected_index = 1
-            updates["messages"].append("System: Second music selected")
+        if response_lower in self.SELECTION_REPLIES:
+            selected_index = self.SELECTION_REPLIES[response_lower]
+            updates["messages"].append(f"System: {('First', 'Second')[selected_index]} music selected")
             
         elif "both" in response_lower:
             selected_index = 0
@@ -571,12 +840,12 @@ Create detailed music parameters for this request.
             next_node = "music_generator"
             
         else:
-            # Treat as feedback - do remake
+            # Treat as feedback - remake from the generated tracks' style/title
             updates["is_remake_requested"] = True
             updates["remake_instructions"] = user_response
             updates["current_stage"] = "generating_music"
             updates["messages"].append(f"System: Will regenerate based on feedback: {user_response}")
-            next_node = "music_generator"
+            next_node = "music_remake"
         
         # If selection made, update state
         if selected_index is not None:
@@ -585,47 +854,34 @@ Create detailed music parameters for this request.
             updates["selected_audio_url"] = audio_urls[selected_index] if audio_urls else None
             updates["selected_audio_file_path"] = audio_paths[selected_index] if audio_paths else None
             updates["is_music_selected"] = True
-            updates["current_stage"] = "generating_cover" if "cover" in state.get("task_queue", []) else "delivering"
             
-            # Move to next task
-            if "cover" in state.get("task_queue", []):
+            # Move to next task (the cover may already exist from music_generator)
+            task_queue = state.get("task_queue", [])
+            if "cover" in task_queue:
+                updates["current_stage"] = "generating_cover"
                 next_node = "cover_generator"
+            elif "video" in task_queue and state.get("is_cover_generated"):
+                updates["current_stage"] = "generating_video"
+                next_node = "video_generator"
             else:
+                updates["current_stage"] = "delivering"
                 next_node = "delivery_agent"
         
         return Command(update=updates, goto=next_node)
 
-    def music_remake(self, state: UnifiedState):
+    async def music_remake(self, state: UnifiedState):
         """Regenerates existing music"""
         
-        print("\nMUSIC REMAKE started...")
+        logger.info("Music remake started")
         
-        system_message = """Edit existing music based on user feedback.
-Keep original style but apply requested changes."""
-
-        human_message = """
-Original style: {original_style}
-Original title: {original_title}
-User feedback: {feedback}
-
-Create new music parameters.
-"""
-
-        template = ChatPromptTemplate.from_messages([
-            ("system", system_message),
-            ("human", human_message)
-        ])
-
-        chain = template | self.llm.with_structured_output(MusicBaseModel)
-
-        remake_params = chain.invoke({
+        remake_params = await self._remake_chain.ainvoke({
             "original_style": state.get("music_style", ""),
             "original_title": state.get("music_title", ""),
             "feedback": state.get("remake_instructions", "")
         })
 
         # Remake with Suno API
-        api_result = self.suno_api.remake_music(state, remake_params)
+        api_result = await self.suno_api.aremake_music(state, remake_params)
 
         if api_result["is_generated"]:
             updated_state = api_result["current_state"]
@@ -636,7 +892,7 @@ Create new music parameters.
                     "is_music_selected": False,
                     "generated_audio_ids": updated_state.get("generated_audio_ids", []),
                     "generated_audio_urls": updated_state.get("generated_audio_urls", []),
-                    "generated_audio_file_paths": updated_state.get("generated_audio_file_adress", []),
+                    "generated_audio_file_paths": updated_state.get("generated_audio_file_paths", []),
                     "is_remake_requested": False,
                     "messages": ["System: Music regenerated"]
                 },
@@ -655,67 +911,61 @@ Create new music parameters.
     # COVER GENERATION LAYER  
     # ================================================================
 
-    def cover_generator(self, state: UnifiedState):
-        """Generates album cover"""
-        
-        print("\nCOVER GENERATOR started...")
+    async def _generate_cover(self, music_style: str, music_title: str, cover_description: str) -> dict:
+        """Writes the image prompt and renders it; returns the cover state fields"""
         
-        system_message = """You are a music cover art creation expert.
-        
-# RULES:
-- Minimalist and impactful designs
-- Visuals that reflect the music's soul
-- Avoid excessive detail and complexity
-- Prompt should be in ENGLISH
-- Don't add text to cover (unless requested)
-"""
-
-        human_message = """
-Music style: {music_style}
-Music title: {music_title}
-Additional description: {cover_description}
-
-Create an impactful cover design prompt for this music.
-"""
-
-        template = ChatPromptTemplate.from_messages([
-            ("system", system_message),
-            ("human", human_message)
-        ])
-
-        chain = template | self.llm.with_structured_output(ImagePromptBaseModel)
-
-        result = chain.invoke({
-            "music_style": state.get("music_style", ""),
-            "music_title": state.get("music_title", ""),
-            "cover_description": state.get("cover_description", "")
+        result = await self._cover_chain.ainvoke({
+            "music_style": music_style,
+            "music_title": music_title,
+            "cover_description": cover_description
         })
 
-        print(f"   Prompt: {result.prompt[:100]}...")
+        logger.debug("Cover prompt: %.100s", result.prompt)
 
         # Generate image with Google API
-        import uuid
         cover_id = str(uuid.uuid4())
-        image_path = f"artifacts/generated_images/{cover_id}.png"
+        image_path = f"{IMAGES_DIR}/{cover_id}.png"
+        
+        generated_path = await asyncio.to_thread(self.google_api.generate_image, result.prompt, image_path)
+        logger.info("Cover generated: %s", generated_path)
         
+        return {
+            "cover_image_path": generated_path,
+            "cover_image_id": cover_id,
+            "cover_prompt": result.prompt,
+            "is_cover_generated": True
+        }
+
+    async def _prefetch_cover(self, music_style: str, music_title: str, cover_description: str) -> dict:
+        """Cover run alongside Suno; on failure cover_generator retries it later"""
         try:
-            generated_path = self.google_api.generate_image(result.prompt, image_path)
+            return await self._generate_cover(music_style, music_title, cover_description)
+        except Exception as e:
+            logger.warning("Parallel cover failed, will retry after selection: %s", e)
+            return {}
+
+    async def cover_generator(self, state: UnifiedState):
+        """Generates album cover"""
+        
+        logger.info("Cover generator started")
+        
+        try:
+            cover = await self._generate_cover(
+                state.get("music_style", ""),
+                state.get("music_title", ""),
+                state.get("cover_description", "")
+            )
             
             # Update task queue
             remaining_tasks = [t for t in state.get("task_queue", []) if t != "cover"]
             completed = state.get("completed_tasks", []) + ["cover"]
             
-            print(f"   Cover generated: {generated_path}")
-            
             # Is there a video task?
             next_node = "video_generator" if "video" in remaining_tasks else "delivery_agent"
             
             return Command(
                 update={
-                    "cover_image_path": generated_path,
-                    "cover_image_id": cover_id,
-                    "cover_prompt": result.prompt,
-                    "is_cover_generated": True,
+                    **cover,
                     "current_stage": "generating_video" if "video" in remaining_tasks else "delivering",
                     "task_queue": remaining_tasks,
                     "completed_tasks": completed,
@@ -724,7 +974,7 @@ Create an impactful cover design prompt for this music.
                 goto=next_node
             )
         except Exception as e:
-            print(f"   Cover could not be generated: {e}")
+            logger.warning("Cover could not be generated: %s", e)
             return Command(
                 update={
                     "error_message": str(e),
@@ -738,19 +988,15 @@ Create an impactful cover design prompt for this music.
     # VIDEO GENERATION LAYER
     # ================================================================
 
-    def video_generator(self, state: UnifiedState):
+    async def video_generator(self, state: UnifiedState):
         """Music + Cover = Video"""
         
-        print("\nVIDEO GENERATOR started...")
-        
-        import subprocess
-        import uuid
+        logger.info("Video generator started")
         
         image_path = state.get("cover_image_path")
         audio_path = state.get("selected_audio_file_path")
         
-        print(f"   Image: {image_path}")
-        print(f"   Audio: {audio_path}")
+        logger.debug("Video inputs: image=%s audio=%s", image_path, audio_path)
         
         if not image_path or not audio_path:
             return Command(
@@ -762,35 +1008,58 @@ Create an impactful cover design prompt for this music.
             )
         
         try:
-            os.makedirs("artifacts/final_videos", exist_ok=True)
             output_name = f"{uuid.uuid4()}.mp4"
-            output_path = f"artifacts/final_videos/{output_name}"
+            output_path = f"{VIDEOS_DIR}/{output_name}"
+            
+            # Suno usually returns MP3, which still needs an AAC pass for MP4
+            if os.path.splitext(audio_path)[1].lower() in AAC_AUDIO_EXTENSIONS:
+                audio_args = ['-c:a', 'copy']
+            else:
+                audio_args = ['-c:a', 'aac', '-b:a', '192k']
             
             # FFmpeg command
             command = [
                 'ffmpeg',
                 '-loop', '1',
+                '-framerate', VIDEO_FRAMERATE,
                 '-i', image_path,
                 '-i', audio_path,
                 '-c:v', 'libx264',
                 '-tune', 'stillimage',
-                '-c:a', 'aac',
-                '-b:a', '192k',
+                *audio_args,
                 '-pix_fmt', 'yuv420p',
+                '-threads', '0',
                 '-shortest',
+                '-movflags', '+faststart',
                 '-y',
                 output_path
             ]
             
-            print("   Running FFmpeg...")
-            subprocess.run(command, check=True, capture_output=True, text=True)
+            logger.debug("Running FFmpeg")
+            async with self._encode_slots:
+                process = await asyncio.create_subprocess_exec(
+                    *command,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                _, stderr = await process.communicate()
             
-            if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            if process.returncode != 0:
+                error_lines = stderr.decode(errors="replace").strip().splitlines()
+                raise Exception(f"FFmpeg exited with code {process.returncode}: {error_lines[-1] if error_lines else ''}")
+            
+            # One stat() covers both "exists" and "non-empty"
+            try:
+                video_size = os.stat(output_path).st_size
+            except FileNotFoundError:
+                video_size = 0
+            
+            if video_size > 0:
                 # Update task queue
                 remaining_tasks = [t for t in state.get("task_queue", []) if t != "video"]
                 completed = state.get("completed_tasks", []) + ["video"]
                 
-                print(f"   Video created: {output_path}")
+                logger.info("Video created: %s", output_path)
                 
                 return Command(
                     update={
@@ -807,7 +1076,7 @@ Create an impactful cover design prompt for this music.
                 raise Exception("Video file could not be created")
                 
         except Exception as e:
-            print(f"   Video error: {e}")
+            logger.warning("Video error: %s", e)
             return Command(
                 update={
                     "error_message": str(e),
@@ -821,72 +1090,45 @@ Create an impactful cover design prompt for this music.
     # DELIVERY LAYER
     # ================================================================
 
-    def delivery_agent(self, state: UnifiedState):
+    async def delivery_agent(self, state: UnifiedState):
         """Delivers generated content to user as links"""
         
-        print("\nDELIVERY AGENT started...")
+        logger.info("Delivery agent started")
         
         phone = state["phone_number"]
         delivered = []
+        parts = []
+        
+        ready = [
+            (name, path_key, kind, template)
+            for name, flag_key, path_key, kind, template in self.DELIVERY_SPEC
+            if state.get(flag_key) and state.get(path_key)
+        ]
+        
+        # Built off the event loop: the link hook may upload the file first
+        file_urls = await asyncio.gather(
+            *(asyncio.to_thread(self.file_url, state[path_key], kind) for _, path_key, kind, _ in ready),
+            return_exceptions=True
+        )
         
-        # Music delivery (as link)
-        if state.get("is_music_selected") and state.get("selected_audio_file_path"):
-            audio_path = state["selected_audio_file_path"]
-            try:
-                if hasattr(self, 'get_file_url') and self.get_file_url:
-                    file_url = self.get_file_url(audio_path)
-                else:
-                    filename = os.path.basename(audio_path)
-                    file_url = f"http://localhost:5000/files/music/{filename}"
-                
-                self.message_helper.send_message(phone, f"Your selected music:\n{file_url}")
-                delivered.append("music")
-                print(f"   Music link delivered: {file_url}")
-                time.sleep(2)
-            except Exception as e:
-                print(f"   Music delivery error: {e}")
-        
-        # Cover delivery (as link)
-        if state.get("is_cover_generated") and state.get("cover_image_path"):
-            cover_path = state["cover_image_path"]
-            try:
-                if hasattr(self, 'get_file_url') and self.get_file_url:
-                    file_url = self.get_file_url(cover_path)
-                else:
-                    filename = os.path.basename(cover_path)
-                    file_url = f"http://localhost:5000/files/image/{filename}"
-                
-                self.message_helper.send_message(phone, f"Album cover:\n{file_url}")
-                delivered.append("cover")
-                print(f"   Cover link delivered: {file_url}")
-                time.sleep(2)
-            except Exception as e:
-                print(f"   Cover delivery error: {e}")
+        for (name, _, _, template), file_url in zip(ready, file_urls):
+            if isinstance(file_url, Exception):
+                logger.warning("%s link error: %s", name, file_url)
+                continue
+            parts.append(template % file_url)
+            delivered.append(name)
         
-        # Video delivery (as link)
-        if state.get("is_video_generated") and state.get("video_file_path"):
-            video_path = state["video_file_path"]
-            try:
-                if hasattr(self, 'get_file_url') and self.get_file_url:
-                    file_url = self.get_file_url(video_path)
-                else:
-                    filename = os.path.basename(video_path)
-                    file_url = f"http://localhost:5000/files/video/{filename}"
-                
-                self.message_helper.send_message(phone, f"Your music video:\n{file_url}")
-                delivered.append("video")
-                print(f"   Video link delivered: {file_url}")
-                time.sleep(2)
-            except Exception as e:
-                print(f"   Video delivery error: {e}")
-        
-        # Closing message
-        if delivered:
-            closing_message = "All content is ready! Would you like anything else?"
-        else:
-            closing_message = "Hmm, couldn't find content to send. What would you like me to do?"
+        # Closing line
+        closing_message = DELIVERY_CLOSING if delivered else DELIVERY_CLOSING_EMPTY
         
-        self.message_helper.send_message(phone, closing_message)
+        # Links and closing line go out as one message (links stay clickable on their own lines)
+        parts.append(closing_message)
+        try:
+            await self._whatsapp(self.message_helper.send_message, phone, "\n\n".join(parts))
+            logger.info("Delivered: %s", delivered)
+        except Exception as e:
+            logger.warning("Delivery error: %s", e)
+            delivered = []
         
         return Command(
             update={
@@ -901,120 +1143,57 @@ Create an impactful cover design prompt for this music.
 
     def finish(self, state: UnifiedState):
         """Terminates workflow"""
-        print("\nWORKFLOW COMPLETED")
+        logger.info("Workflow completed")
         return state
 
     # ================================================================
     # MEDIA SENDERS (Direct)
     # ================================================================
 
-    def send_music(self, state: UnifiedState):
+    async def send_music(self, state: UnifiedState):
         """Sends selected music"""
-        phone = state["phone_number"]
-        audio_path = state.get("selected_audio_file_path")
-        
-        if not audio_path:
-            return Command(
-                update={"messages": ["System: No music to send"]},
-                goto="communication_agent"
-            )
-        
-        try:
-            self.message_helper.send_audio(phone, audio_path)
-            return Command(
-                update={"messages": ["System: Music sent"]},
-                goto="communication_agent"
-            )
-        except Exception as e:
-            return Command(
-                update={"messages": [f"System: Music could not be sent: {e}"]},
-                goto="communication_agent"
-            )
+        return await self._send_media(state, "music")
 
-    def send_cover(self, state: UnifiedState):
+    async def send_cover(self, state: UnifiedState):
         """Sends cover image"""
-        phone = state["phone_number"]
-        cover_path = state.get("cover_image_path")
-        
-        if not cover_path:
-            return Command(
-                update={"messages": ["System: No cover to send"]},
-                goto="communication_agent"
-            )
-        
-        try:
-            self.message_helper.send_message(phone, "Cover image:")
-            return Command(
-                update={"messages": ["System: Cover sent"]},
-                goto="communication_agent"
-            )
-        except Exception as e:
-            return Command(
-                update={"messages": [f"System: Cover could not be sent: {e}"]},
-                goto="communication_agent"
-            )
+        return await self._send_media(state, "cover")
 
-    def send_video(self, state: UnifiedState):
+    async def send_video(self, state: UnifiedState):
         """Sends video"""
-        phone = state["phone_number"]
-        video_path = state.get("video_file_path")
+        return await self._send_media(state, "video")
+
+    async def _send_media(self, state: UnifiedState, kind: str):
+        """Uploads one media file in the background so the conversation moves on right away"""
+        path_key, helper_name, label = self.MEDIA_SPEC[kind]
+        media_path = state.get(path_key)
         
-        if not video_path:
+        if not media_path:
             return Command(
-                update={"messages": ["System: No video to send"]},
+                update={"messages": [f"System: No {label.lower()} to send"]},
                 goto="communication_agent"
             )
         
-        try:
-            self.message_helper.send_video(phone, video_path)
-            return Command(
-                update={"messages": ["System: Video sent"]},
-                goto="communication_agent"
-            )
-        except Exception as e:
-            return Command(
-                update={"messages": [f"System: Video could not be sent: {e}"]},
-                goto="communication_agent"
-            )
+        self._run_in_background(self._whatsapp(getattr(self.message_helper, helper_name), state["phone_number"], media_path))
+        return Command(
+            update={"messages": [f"System: {label} upload started"]},
+            goto="communication_agent"
+        )
 
     # ================================================================
     # GRAPH SETUP
     # ================================================================
 
     def build_graph(self):
-        """Creates LangGraph workflow"""
-        
-        graph = StateGraph(UnifiedState)
-        
-        # Communication nodes
-        graph.add_node("communication_agent", self.communication_agent)
-        graph.add_node("send_message", self.send_message)
-        graph.add_node("wait_user", self.wait_user)
-        graph.add_node("choice_persona", self.choice_persona)
-        graph.add_node("send_music", self.send_music)
-        graph.add_node("send_cover", self.send_cover)
-        graph.add_node("send_video", self.send_video)
+        """Creates LangGraph workflow (compiled once per supervisor)"""
         
-        # Task planning
-        graph.add_node("task_planner", self.task_planner)
-        
-        # Music generation
-        graph.add_node("music_generator", self.music_generator)
-        graph.add_node("music_selection_prompt", self.music_selection_prompt)
-        graph.add_node("music_selection_handler", self.music_selection_handler)
-        graph.add_node("music_remake", self.music_remake)
+        if self.workflow is not None:
+            return self.workflow
         
-        # Cover generation
-        graph.add_node("cover_generator", self.cover_generator)
-        
-        # Video generation
-        graph.add_node("video_generator", self.video_generator)
-        
-        # Delivery
-        graph.add_node("delivery_agent", self.delivery_agent)
+        graph = StateGraph(UnifiedState)
         
-        # Finish
-        graph.add_node("finish", self.finish)
+        # Every node is the method of the same name
+        for name in self.GRAPH_NODES:
+            graph.add_node(name, getattr(self, name))
         
         # Entry point
         graph.set_entry_point("communication_agent")
@@ -1022,17 +1201,22 @@ Create an impactful cover design prompt for this music.
         # End edge
         graph.add_edge("finish", END)
         
-        # Compile with memory and interrupt points
-        self.workflow = graph.compile(
-            checkpointer=self.memory,
-            interrupt_before=["wait_user", "music_selection_handler"]
-        )
+        # Compile with memory; wait_user and music_selection_handler pause
+        # themselves with interrupt() and are resumed with Command(resume=...)
+        self.workflow = graph.compile(checkpointer=self.memory)
         
         return self.workflow
 
 
-# Factory function
-def create_system_supervisor():
-    supervisor = SystemSupervisor()
-    supervisor.build_graph()
-    return supervisor
\ No newline at end of file
+# Factory function - one supervisor and compiled graph per process;
+# conversations are isolated by thread_id, not by instance
+_supervisor = None
+
+
+def create_system_supervisor(checkpointer=None):
+    global _supervisor
+    if _supervisor is None:
+        supervisor = SystemSupervisor(checkpointer)
+        supervisor.build_graph()
+        _supervisor = supervisor
+    return _supervisor
\ No newline at end of file
@@ -1,5 +1,7 @@
 import os
-import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import Optional
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
@@ -16,20 +18,22 @@ from langgraph.types import interrupt
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
 
-class UserCommunicationAgent:
+# Routing is a small fixed-choice classification; same fast model the supervisor routes with
+DECISION_MODEL = os.getenv("LLM_FAST_MODEL", "gpt-4o-mini")
 
-    def __init__(self):
-        self.llm = ChatOpenAI(model="gpt-4o")
-        self.message_helper = WhatsApp()
-        self.persona_db = PersonaDB()
-        self.memory = MemorySaver()
-        self.workflow = None
+# Recent messages shown to the communication LLM (state keeps up to MESSAGE_HISTORY_LIMIT)
+PROMPT_MESSAGE_WINDOW = 10
 
-    def communication_agent(self, state: UserComminicationState):
-        """Main communication agent - analyzes messages and decides on action"""
-        
-        system_message = """You are the user communication manager of a music production company. Your purpose is to analyze the current situation and take action.
+# Concurrent media uploads started by the send nodes
+SEND_WORKERS = 8
+
+
+# The system message holds no {placeholders} so every call starts with the
+# same bytes (OpenAI prompt caching); the status flags go in the human message.
+
+COMMUNICATION_SYSTEM_MESSAGE = """You are the user communication manager of a music production company. Your purpose is to analyze the current situation and take action.
 
 # Actions 
 - **send_message**: Send an informational message to the user (then wait_user)
@@ -46,11 +50,6 @@ class UserCommunicationAgent:
 - After wait_user, returns to communication_agent
 - Don't use finish unless process is completely done
 
-# Current Status:
-- is_music_generated: {is_music_generated}
-- is_cover_generated: {is_cover_generated}
-- is_video_generated: {is_video_generated}
-
 # Decision Logic:
 1. User said hello + nothing generated → send_message (then wait_user)
 2. User requested music + not generated → supervisor
@@ -60,35 +59,82 @@ class UserCommunicationAgent:
 
 Communicate naturally and friendly.
 """
-        
-        human_message = """
+
+COMMUNICATION_HUMAN_MESSAGE = """
+# Current Status:
+- is_music_generated: {is_music_generated}
+- is_cover_generated: {is_cover_generated}
+- is_video_generated: {is_video_generated}
+
 # Conversation History:
 {messages}
 
 Analyze situation and determine action.
 """
 
-        communication_template = ChatPromptTemplate.from_messages([
-            ("system", system_message),
-            ("human", human_message)
-        ])
+COMMUNICATION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", COMMUNICATION_SYSTEM_MESSAGE),
+    ("human", COMMUNICATION_HUMAN_MESSAGE)
+])
 
-        communication_chain = communication_template | self.llm.with_structured_output(
-            CommunicationDecisionBaseModel
-        )
 
-        result = communication_chain.invoke({
-            "messages": state["messages"],
-            "is_music_generated": state.get("is_music_generated", False),
-            "is_cover_generated": state.get("is_cover_generated", False),
-            "is_video_generated": state.get("is_video_remake_generated", False)
-        })
+class UserCommunicationAgent:
+
+    # kind -> (path key, WhatsApp helper method, label, flag cleared after sending)
+    MEDIA_SPEC = {
+        "music": ("selected_audio_file_path", "send_audio", "Music", "is_music_generated"),
+        "cover": ("cover_image_path", "send_image", "Cover", "is_cover_generated"),
+        "video": ("video_file_path", "send_video", "Video", "is_video_remake_generated")
+    }
+
+    # Media WhatsApp shows a caption for (audio has none, so its description is a separate message)
+    CAPTIONED_MEDIA = {"cover", "video"}
+
+    # Decision Logic rules the prompt spells out, in order: (media kind, action, message sent with it)
+    READY_MEDIA_RULES = (
+        ("music", "send_music", "Your music is ready!"),
+        ("cover", "send_cover", "Your cover is ready!"),
+        ("video", "send_video", "Your video is ready!")
+    )
+
+    def __init__(self):
+        self.llm = ChatOpenAI(model=DECISION_MODEL, temperature=0)
+        self._communication_chain = COMMUNICATION_PROMPT | self.llm.with_structured_output(CommunicationDecisionBaseModel)
+        self.message_helper = WhatsApp()
+        self.persona_db = PersonaDB()
+        self.memory = MemorySaver()
+        self.workflow = None
+        
+        # Media uploads started by the send nodes; finish waits for them
+        self._send_pool = ThreadPoolExecutor(max_workers=SEND_WORKERS, thread_name_prefix="whatsapp-upload")
+        self._pending_sends = set()
+        self._pending_lock = threading.Lock()
+        # (phone, kind) uploads that failed and are routed once more; resends that fail are only reported
+        self._failed_sends = set()
+        self._resends = set()
+        
+        # Last formatted persona list, keyed by the (name, description) pairs it shows
+        self._persona_message: tuple = (None, "")
+
+    def communication_agent(self, state: UserComminicationState):
+        """Main communication agent - analyzes messages and decides on action"""
+        
+        # Ready-but-unsent media is decided locally; the LLM handles everything else
+        action, description = self._route_by_rules(state)
+        
+        if action is None:
+            result = self._communication_chain.invoke({
+                "messages": state["messages"][-PROMPT_MESSAGE_WINDOW:],
+                "is_music_generated": state.get("is_music_generated", False),
+                "is_cover_generated": state.get("is_cover_generated", False),
+                "is_video_generated": state.get("is_video_remake_generated", False)
+            })
 
-        action = result.action
-        description = result.description
+            action = result.action
+            description = result.description
 
-        print(f"--- Communication Agent Decision: {action.upper()} ---")
-        print(f"--- Reason: {description} ---")
+        logger.info("Communication agent decision: %s", action)
+        logger.debug("Reason: %s", description)
 
         return Command(
             update={
@@ -99,6 +145,32 @@ Analyze situation and determine action.
         )
 
 
+    def _route_by_rules(self, state: UserComminicationState):
+        """(action, description) for media that is ready and not sent yet, else (None, None)"""
+        phone = state.get("phone_number")
+        for kind, action, description in self.READY_MEDIA_RULES:
+            path_key, _, _, flag_key = self.MEDIA_SPEC[kind]
+            # Flags are cleared when the upload is handed off, so each media is routed once
+            # (plus one resend if that upload failed). A flag without a file (music generated
+            # but not selected yet) is left to the LLM: send_* would find nothing to send
+            # and this rule would fire forever.
+            if state.get(path_key) and (state.get(flag_key) or self._take_failed(phone, kind)):
+                return action, description
+        
+        return None, None
+
+
+    def _take_failed(self, phone: str, kind: str) -> bool:
+        """True (once) if the last upload of this media failed; the resend is marked as such"""
+        key = (phone, kind)
+        with self._pending_lock:
+            if key not in self._failed_sends:
+                return False
+            self._failed_sends.discard(key)
+            self._resends.add(key)
+            return True
+
+
     def send_message(self, state: UserComminicationState):
         """Sends message to user"""
         
@@ -107,7 +179,7 @@ Analyze situation and determine action.
         
         try:
             self.message_helper.send_message(phone, message_text)
-            print(f"Message Sent: {phone}")
+            logger.info("Message sent: %s", phone)
             
             return Command(
                 update={
@@ -116,7 +188,7 @@ Analyze situation and determine action.
                 goto="communication_agent"
             )
         except Exception as e:
-            print(f"Message Send Error: {str(e)}")
+            logger.warning("Message send error: %s", e)
             return Command(
                 update={
                     "messages": [f"System: Message could not be sent - {str(e)}"]
@@ -127,134 +199,95 @@ Analyze situation and determine action.
 
     def send_music(self, state: UserComminicationState):
         """Sends generated music to user"""
-        
-        audio_path = state.get("selected_audio_file_adress")
-        description = state["description"]
-        phone = state["phone_number"]
-        
-        if not audio_path:
-            return Command(
-                update={
-                    "messages": ["System: Music file not found"]
-                },
-                goto="communication_agent"
-            )
-        
-        try:
-            # Description first
-            if description:
-                self.message_helper.send_message(phone, description)
-                time.sleep(1)
-            
-            # Send music
-            self.message_helper.send_audio(phone, audio_path)
-            print(f"Music Sent: {phone}")
-            
-            return Command(
-                update={
-                    "messages": [
-                        f"Assistant: {description}",
-                        "System: Music sent"
-                    ],
-                    "is_music_generated": False  # Prevent resending
-                },
-                goto="communication_agent"
-            )
-        except Exception as e:
-            print(f"Music Send Error: {str(e)}")
-            return Command(
-                update={
-                    "messages": [f"System: Music could not be sent - {str(e)}"]
-                },
-                goto="communication_agent"
-            )
+        return self._send_media(state, "music")
 
 
     def send_cover(self, state: UserComminicationState):
         """Sends song cover to user"""
+        return self._send_media(state, "cover")
+
+
+    def send_video(self, state: UserComminicationState):
+        """Sends video to user"""
+        return self._send_media(state, "video")
+
+
+    def _send_media(self, state: UserComminicationState, kind: str):
+        """Sends the description, then the media file; clears its flag to prevent resending"""
         
-        cover_path = state.get("cover_image_path")
+        path_key, helper_name, label, flag_key = self.MEDIA_SPEC[kind]
+        media_path = state.get(path_key)
         description = state["description"]
         phone = state["phone_number"]
         
-        if not cover_path:
+        if not media_path:
             return Command(
                 update={
-                    "messages": ["System: Cover image not found"]
+                    "messages": [f"System: {label} file not found"]
                 },
                 goto="communication_agent"
             )
         
-        try:
-            if description:
-                self.message_helper.send_message(phone, description)
-                time.sleep(1)
-            
-            # Send image - send_image method will be added to WhatsApp helper
-            # self.message_helper.send_image(phone, cover_path)
-            print(f"Cover Sent: {phone}")
-            
-            return Command(
-                update={
-                    "messages": [
-                        f"Assistant: {description}",
-                        "System: Cover sent"
-                    ],
-                    "is_cover_generated": False
-                },
-                goto="communication_agent"
-            )
-        except Exception as e:
-            print(f"Cover Send Error: {str(e)}")
-            return Command(
-                update={
-                    "messages": [f"System: Cover could not be sent - {str(e)}"]
-                },
-                goto="communication_agent"
-            )
+        send_media = getattr(self.message_helper, helper_name)
+        
+        def deliver():
+            if kind in self.CAPTIONED_MEDIA:
+                # One request: the description goes out as the caption
+                send_media(phone, media_path, caption=description)
+            else:
+                # Description first
+                if description:
+                    self.message_helper.send_message(phone, description)
+                send_media(phone, media_path)
+            logger.info("%s sent: %s", label, phone)
+        
+        # Uploads can take a while; the next decision doesn't need to wait for them
+        self._send_in_background(phone, kind, deliver)
+        
+        return Command(
+            update={
+                "messages": [
+                    f"Assistant: {description}",
+                    f"System: {label} upload started"
+                ],
+                flag_key: False
+            },
+            goto="communication_agent"
+        )
 
 
-    def send_video(self, state: UserComminicationState):
-        """Sends video to user"""
+    def _send_in_background(self, phone: str, kind: str, send):
+        """Runs a send on the upload pool; a failure is reported to the user when it completes"""
+        future = self._send_pool.submit(send)
+        with self._pending_lock:
+            self._pending_sends.add(future)
+        future.add_done_callback(lambda f: self._send_done(phone, kind, f))
+
+
+    def _send_done(self, phone: str, kind: str, future):
+        key = (phone, kind)
+        with self._pending_lock:
+            self._pending_sends.discard(future)
+            resend = key in self._resends
+            self._resends.discard(key)
+            if future.exception() and not resend:
+                # Routed again by _route_by_rules on the next communication_agent pass
+                self._failed_sends.add(key)
         
-        video_path = state.get("video_file_path")
-        description = state["description"]
-        phone = state["phone_number"]
+        if not future.exception():
+            return
         
-        if not video_path:
-            return Command(
-                update={
-                    "messages": ["System: Video file not found"]
-                },
-                goto="communication_agent"
-            )
+        label = self.MEDIA_SPEC[kind][2]
+        logger.warning("%s send error: %s", label, future.exception())
         
+        if resend:
+            notice = f"Sorry, your {label.lower()} couldn't be sent. Please ask again a bit later."
+        else:
+            notice = f"Sorry, your {label.lower()} didn't go through. I'll send it again with my next reply."
         try:
-            if description:
-                self.message_helper.send_message(phone, description)
-                time.sleep(1)
-            
-            self.message_helper.send_video(phone, video_path)
-            print(f"Video Sent: {phone}")
-            
-            return Command(
-                update={
-                    "messages": [
-                        f"Assistant: {description}",
-                        "System: Video sent"
-                    ],
-                    "is_video_remake_generated": False
-                },
-                goto="communication_agent"
-            )
+            self.message_helper.send_message(phone, notice)
         except Exception as e:
-            print(f"Video Send Error: {str(e)}")
-            return Command(
-                update={
-                    "messages": [f"System: Video could not be sent - {str(e)}"]
-                },
-                goto="communication_agent"
-            )
+            logger.warning("Upload failure notice error: %s", e)
 
 
     def choice_persona(self, state: UserComminicationState):
@@ -277,17 +310,20 @@ Analyze situation and determine action.
                 goto="communication_agent"
             )
         
-        # Format persona list
-        persona_list_message = "Saved Personas:\n\n"
-        for idx, persona in enumerate(personas, 1):
-            persona_list_message += f"{idx}. {persona['name']}\n"
-            persona_list_message += f"   {persona['description']}\n\n"
-        
-        persona_list_message += "\nWhich persona would you like to use? (Send number)"
+        # Format persona list (reused while the catalog is unchanged)
+        key = tuple((persona['name'], persona['description']) for persona in personas)
+        if self._persona_message[0] != key:
+            persona_list_message = "".join([
+                "Saved Personas:\n\n",
+                *(f"{idx}. {name}\n   {description}\n\n" for idx, (name, description) in enumerate(key, 1)),
+                "\nWhich persona would you like to use? (Send number)"
+            ])
+            self._persona_message = (key, persona_list_message)
+        persona_list_message = self._persona_message[1]
         
         try:
             self.message_helper.send_message(phone, persona_list_message)
-            print("Persona List Sent")
+            logger.info("Persona list sent")
             
             return Command(
                 update={
@@ -311,12 +347,12 @@ Analyze situation and determine action.
     def wait_user(self, state: UserComminicationState):
         """Human-in-the-loop: Waits for user message"""
         
-        print("--- Waiting for User Response (Human-in-the-loop) ---")
+        logger.info("Waiting for user response (human-in-the-loop)")
         
         # Use interrupt() - this stops the workflow
         user_message = interrupt("Waiting for user response...")
         
-        print(f"--- User Response Received: {user_message} ---")
+        logger.info("User response received: %s", user_message)
         
         return Command(
             update={
@@ -331,7 +367,7 @@ Analyze situation and determine action.
         
         supervisor_request = state["description"]
         
-        print(f"--- Routing to Supervisor: {supervisor_request} ---")
+        logger.info("Routing to supervisor: %s", supervisor_request)
         
         # MusicSupervizorAgentSystem will be called here
         # music_result = music_system.workflow.invoke({
@@ -349,7 +385,11 @@ Analyze situation and determine action.
 
     def finish(self, state: UserComminicationState):
         """Ends the process"""
-        print("--- Workflow Completed ---")
+        # Don't report completion while uploads are still going out
+        with self._pending_lock:
+            pending = list(self._pending_sends)
+        wait(pending)
+        logger.info("Workflow completed")
         return state
 
 
@@ -375,10 +415,7 @@ Analyze situation and determine action.
         # Connect finish to END
         graph.add_edge("finish", END)
         
-        # Compile with MemorySaver
-        self.workflow = graph.compile(
-            checkpointer=self.memory,
-            interrupt_before=["wait_user"]
-        )
+        # Compile with MemorySaver; wait_user pauses itself with interrupt()
+        self.workflow = graph.compile(checkpointer=self.memory)
         
         return self.workflow
\ No newline at end of file
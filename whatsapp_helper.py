@@ -5,52 +5,210 @@ WhatsApp messaging using Evolution API.
 """
 
 import os
-import base64
-from typing import Optional, List, Dict
+import time
+import logging
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Optional, Dict, FrozenSet
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
 
 # Evolution API import - try/except for different versions
 try:
     from evolutionapi.client import EvolutionClient
-    from evolutionapi.models.message import TextMessage, MediaMessage, MediaType
+    from evolutionapi.models.message import TextMessage, MediaType
+    from requests_toolbelt import MultipartEncoder  # installed with evolutionapi
     EVOLUTION_AVAILABLE = True
 except ImportError:
     EVOLUTION_AVAILABLE = False
-    print("Warning: evolutionapi package not found")
+    logger.warning("evolutionapi package not found")
+
+# Evolution API connection and access settings, read once at import
+EVOLUTION_API_URL = os.getenv("EVOLUTION_API_URL", "http://server:8585")
+EVOLUTION_API_KEY = os.getenv("EVOLUTION_API_KEY", "")
+INSTANCE_NAME = os.getenv("INSTANCE_NAME", "default")
+ALLOWED_NUMBERS = os.getenv("ALLOWED_NUMBERS", "")
+
+# Keep-alive pool shared by every Evolution API call of one WhatsApp helper
+HTTP_POOL_SIZE = 10
+
+# Reconnect attempts when a pooled connection can't be (re)established
+HTTP_CONNECT_RETRIES = 3
+
+# Characters dropped from phone numbers before the JID suffix is removed
+PHONE_STRIP_TABLE = str.maketrans("", "", "+ ")
+
+# Message IDs remembered for dropping redelivered webhooks
+SEEN_MESSAGE_IDS = 4096
+
+# Inbound message kinds in match order: key -> (type, content -> (text, media url))
+WEBHOOK_MESSAGE_PARSERS = {
+    'conversation': ('text', lambda content: (content, None)),
+    'extendedTextMessage': ('text', lambda content: (content.get('text'), None)),
+    'imageMessage': ('image', lambda content: (content.get('caption', ''), content.get('url'))),
+    'audioMessage': ('audio', lambda content: (None, content.get('url'))),
+    'videoMessage': ('video', lambda content: (content.get('caption', ''), content.get('url'))),
+    'documentMessage': ('document', lambda content: (content.get('fileName', ''), content.get('url')))
+}
+WEBHOOK_MESSAGE_KINDS = frozenset(WEBHOOK_MESSAGE_PARSERS)
+
+# Stand-in for missing webhook sections (shared, read-only, never allocated per call)
+EMPTY_SECTION = MappingProxyType({})
+
+# Image mimetypes by extension (anything else is sent as PNG)
+IMAGE_MIMETYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp'
+}
+
+# send_* by media kind: kind -> (label, mimetype; None picks it from IMAGE_MIMETYPES)
+MEDIA_SEND_SPEC = {
+    'audio': ('Audio', 'audio/mpeg'),
+    'image': ('Image', None),
+    'video': ('Video', 'video/mp4'),
+    'document': ('Document', 'application/octet-stream')
+}
+
+# Outgoing message pacing for the instance: sustained sends per second, and
+# how many may go out back to back after a quiet period
+SEND_RATE = float(os.getenv("WHATSAPP_SEND_RATE", "5"))
+SEND_BURST = int(os.getenv("WHATSAPP_SEND_BURST", "10"))
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() only waits once the burst is used up"""
+    
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Take one token, sleeping until one is available"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            # Tokens may go negative: later callers queue up behind earlier ones
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+if EVOLUTION_AVAILABLE:
+    class PooledEvolutionClient(EvolutionClient):
+        """
+        EvolutionClient whose requests go through a shared requests.Session.
+
+        The upstream client calls requests.get/post directly, which opens a new
+        TCP+TLS connection per message. JSON calls and media uploads
+        (post_multipart) both use the session's pool and its connect retries.
+        """
+
+        def __init__(self, base_url: str, api_token: str, session: requests.Session):
+            super().__init__(base_url=base_url, api_token=api_token)
+            self.session = session
+
+        def get(self, endpoint: str, instance_token: str = None):
+            response = self.session.get(
+                self._get_full_url(endpoint),
+                headers=self._get_headers(instance_token)
+            )
+            return self._handle_response(response)
+
+        def post(self, endpoint: str, data: dict = None, instance_token: str = None, files: dict = None):
+            response = self.session.post(
+                self._get_full_url(endpoint),
+                headers=self._get_headers(instance_token),
+                json=data
+            )
+            return response.json()
+
+        def post_multipart(self, endpoint: str, fields: dict, instance_token: str = None):
+            """POST a multipart form, streaming file parts from their file objects"""
+            multipart = MultipartEncoder(fields=fields)
+            headers = self._get_headers(instance_token)
+            headers['Content-Type'] = multipart.content_type
+            response = self.session.post(
+                self._get_full_url(endpoint),
+                headers=headers,
+                data=multipart
+            )
+            return response.json()
 
 
 class WhatsApp:
     """WhatsApp messaging helper - Evolution API wrapper"""
     
     def __init__(self):
-        self.base_url = os.getenv("EVOLUTION_API_URL", "http://server:8585")
-        self.api_key = os.getenv("EVOLUTION_API_KEY", "")
-        self.instance_name = os.getenv("INSTANCE_NAME", "default")
+        self.base_url = EVOLUTION_API_URL
+        self.api_key = EVOLUTION_API_KEY
+        self.instance_name = INSTANCE_NAME
+        
+        # One pooled session so consecutive sends reuse the same connection
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=HTTP_POOL_SIZE,
+            pool_maxsize=HTTP_POOL_SIZE,
+            # Only failed connects are retried: nothing has been sent yet, while a POST
+            # (message or media upload) that reached Evolution may already have gone out
+            max_retries=Retry(total=HTTP_CONNECT_RETRIES, connect=HTTP_CONNECT_RETRIES, read=0, redirect=0, status=0, backoff_factor=0.3)
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
         
         self.client = None
         if EVOLUTION_AVAILABLE and self.api_key:
             try:
-                self.client = EvolutionClient(
+                self.client = PooledEvolutionClient(
                     base_url=self.base_url,
-                    api_token=self.api_key
+                    api_token=self.api_key,
+                    session=self.session
                 )
-                print("Evolution client initialized")
+                # Bound once; every send calls these directly
+                self._post_text = self.client.messages.send_text
+                logger.info("Evolution client initialized")
             except Exception as e:
-                print(f"Warning: Evolution client error: {e}")
+                logger.warning("Evolution client error: %s", e)
+        
+        # MediaType values for this evolutionapi version, resolved once
+        self.media_types = {kind: self._get_media_type(kind) for kind in ("audio", "image", "video", "document")}
         
-        # Allowed numbers (empty allows everyone)
-        allowed = os.getenv("ALLOWED_NUMBERS", "")
-        self.allowed_numbers: List[str] = [n.strip() for n in allowed.split(",") if n.strip()]
+        # Shared by every send of this helper (and every thread using it)
+        self.rate_limiter = TokenBucket(SEND_RATE, SEND_BURST)
+        
+        # Recently parsed message IDs, oldest first (webhooks arrive on several threads)
+        self._seen_ids: OrderedDict = OrderedDict()
+        self._seen_lock = threading.Lock()
+        
+        # Allowed numbers, cleaned like incoming ones (empty allows everyone)
+        self.allowed_numbers: FrozenSet[str] = frozenset(
+            self._clean_phone(n.strip()) for n in ALLOWED_NUMBERS.split(",") if n.strip()
+        )
     
     def is_allowed(self, phone: str) -> bool:
         """Is this number allowed?"""
         if not self.allowed_numbers:
             return True
-        clean_phone = phone.replace("+", "").replace(" ", "").replace("@s.whatsapp.net", "")
-        return clean_phone in self.allowed_numbers
+        return self._clean_phone(phone) in self.allowed_numbers
     
     def _clean_phone(self, phone: str) -> str:
         """Clean phone number"""
-        return phone.replace("+", "").replace(" ", "").replace("@s.whatsapp.net", "")
+        return phone.translate(PHONE_STRIP_TABLE).removesuffix("@s.whatsapp.net")
     
     def _get_media_type(self, media_type: str) -> str:
         """Get MediaType enum value - for different API versions"""
@@ -65,7 +223,7 @@ class WhatsApp:
                     mt = getattr(MediaType, media_type.lower())
                     return mt.value if hasattr(mt, 'value') else str(mt)
             except Exception as e:
-                print(f"Warning: MediaType error: {e}")
+                logger.warning("MediaType error: %s", e)
         
         # Fallback: return as string
         return media_type.lower()
@@ -73,7 +231,7 @@ class WhatsApp:
     def send_message(self, phone: str, text: str) -> dict:
         """Send text message"""
         if not self.client:
-            print(f"[MOCK] Message -> {phone}: {text[:50]}...")
+            logger.info("[MOCK] Message -> %s: %.50s...", phone, text)
             return {"status": "mock"}
         
         try:
@@ -81,130 +239,73 @@ class WhatsApp:
                 number=self._clean_phone(phone),
                 text=text
             )
-            return self.client.messages.send_text(
+            self.rate_limiter.acquire()
+            return self._post_text(
                 self.instance_name,
                 message,
                 self.api_key
             )
         except Exception as e:
-            print(f"Message send error: {e}")
+            logger.warning("Message send error: %s", e)
             raise
     
-    def send_audio(self, phone: str, audio_path: str) -> dict:
-        """Send audio file"""
+    def _send_media(self, phone: str, path: str, kind: str, caption: str = None, filename: str = None) -> dict:
+        """Send a media file; kind is a MEDIA_SEND_SPEC key"""
+        label, mimetype = MEDIA_SEND_SPEC[kind]
         if not self.client:
-            print(f"[MOCK] Audio -> {phone}: {audio_path}")
+            logger.info("[MOCK] %s -> %s: %s", label, phone, path)
             return {"status": "mock"}
         
         try:
-            with open(audio_path, 'rb') as f:
-                audio_b64 = base64.b64encode(f.read()).decode()
+            if mimetype is None:
+                mimetype = IMAGE_MIMETYPES.get(os.path.splitext(path)[1].lower(), 'image/png')
             
-            message = MediaMessage(
-                number=self._clean_phone(phone),
-                mediatype=self._get_media_type("audio"),
-                mimetype="audio/mpeg",
-                media=audio_b64,
-                fileName=os.path.basename(audio_path)
-            )
-            return self.client.messages.send_media(
-                self.instance_name,
-                message,
-                self.api_key
-            )
+            filename = filename or os.path.basename(path)
+            self.rate_limiter.acquire()
+            # Same form as the client's send_media (caption empty for audio/documents);
+            # the file is streamed as the "file" part, no base64 copy
+            with open(path, 'rb') as media_file:
+                return self.client.post_multipart(
+                    f'message/sendMedia/{self.instance_name}',
+                    {
+                        'number': self._clean_phone(phone),
+                        'mediatype': self.media_types[kind],
+                        'mimetype': mimetype,
+                        'caption': caption or "",
+                        'fileName': filename,
+                        'file': (filename, media_file, mimetype)
+                    },
+                    self.api_key
+                )
         except Exception as e:
-            print(f"Audio send error: {e}")
+            logger.warning("%s send error: %s", label, e)
             raise
     
+    def send_audio(self, phone: str, audio_path: str) -> dict:
+        """Send audio file"""
+        return self._send_media(phone, audio_path, "audio")
+    
     def send_image(self, phone: str, image_path: str, caption: str = None) -> dict:
         """Send image"""
-        if not self.client:
-            print(f"[MOCK] Image -> {phone}: {image_path}")
-            return {"status": "mock"}
-        
-        try:
-            with open(image_path, 'rb') as f:
-                image_b64 = base64.b64encode(f.read()).decode()
-            
-            ext = os.path.splitext(image_path)[1].lower()
-            mimetype_map = {
-                '.png': 'image/png',
-                '.jpg': 'image/jpeg',
-                '.jpeg': 'image/jpeg',
-                '.gif': 'image/gif',
-                '.webp': 'image/webp'
-            }
-            mimetype = mimetype_map.get(ext, 'image/png')
-            
-            message = MediaMessage(
-                number=self._clean_phone(phone),
-                mediatype=self._get_media_type("image"),
-                mimetype=mimetype,
-                media=image_b64,
-                fileName=os.path.basename(image_path),
-                caption=caption or ""
-            )
-            return self.client.messages.send_media(
-                self.instance_name,
-                message,
-                self.api_key
-            )
-        except Exception as e:
-            print(f"Image send error: {e}")
-            raise
+        return self._send_media(phone, image_path, "image", caption=caption)
     
     def send_video(self, phone: str, video_path: str, caption: str = None) -> dict:
         """Send video"""
-        if not self.client:
-            print(f"[MOCK] Video -> {phone}: {video_path}")
-            return {"status": "mock"}
-        
-        try:
-            with open(video_path, 'rb') as f:
-                video_b64 = base64.b64encode(f.read()).decode()
-            
-            message = MediaMessage(
-                number=self._clean_phone(phone),
-                mediatype=self._get_media_type("video"),
-                mimetype="video/mp4",
-                media=video_b64,
-                fileName=os.path.basename(video_path),
-                caption=caption or ""
-            )
-            return self.client.messages.send_media(
-                self.instance_name,
-                message,
-                self.api_key
-            )
-        except Exception as e:
-            print(f"Video send error: {e}")
-            raise
+        return self._send_media(phone, video_path, "video", caption=caption)
     
     def send_document(self, phone: str, doc_path: str, filename: str = None) -> dict:
         """Send document"""
-        if not self.client:
-            print(f"[MOCK] Document -> {phone}: {doc_path}")
-            return {"status": "mock"}
-        
-        try:
-            with open(doc_path, 'rb') as f:
-                doc_b64 = base64.b64encode(f.read()).decode()
-            
-            message = MediaMessage(
-                number=self._clean_phone(phone),
-                mediatype=self._get_media_type("document"),
-                mimetype="application/octet-stream",
-                media=doc_b64,
-                fileName=filename or os.path.basename(doc_path)
-            )
-            return self.client.messages.send_media(
-                self.instance_name,
-                message,
-                self.api_key
-            )
-        except Exception as e:
-            print(f"Document send error: {e}")
-            raise
+        return self._send_media(phone, doc_path, "document", filename=filename)
+    
+    def _seen_before(self, message_id: str) -> bool:
+        """Records the message ID; True if it was already among the last SEEN_MESSAGE_IDS"""
+        with self._seen_lock:
+            if message_id in self._seen_ids:
+                return True
+            self._seen_ids[message_id] = None
+            if len(self._seen_ids) > SEEN_MESSAGE_IDS:
+                self._seen_ids.popitem(last=False)
+            return False
     
     def parse_webhook(self, webhook_data: dict) -> Optional[Dict]:
         """Parse webhook data"""
@@ -213,11 +314,11 @@ class WhatsApp:
             if webhook_data.get('event') != 'messages.upsert':
                 return None
             
-            data = webhook_data.get('data', {})
-            key = data.get('key', {})
+            data = webhook_data.get('data') or EMPTY_SECTION
+            key = data.get('key') or EMPTY_SECTION
             
             # Ignore our own messages
-            if key.get('fromMe', False):
+            if key.get('fromMe'):
                 return None
             
             # Get phone number
@@ -228,13 +329,18 @@ class WhatsApp:
             
             # Permission check
             if not self.is_allowed(phone):
-                print(f"Warning: {phone} not allowed")
+                logger.warning("%s not allowed", phone)
                 return None
             
             # Get message ID (for duplicate check)
             message_id = key.get('id', '')
             
-            message = data.get('message', {})
+            # Evolution redelivers unacknowledged webhooks; drop IDs already seen
+            if message_id and self._seen_before(message_id):
+                logger.debug("Duplicate (seen ID): %s", message_id)
+                return None
+            
+            message = data.get('message') or EMPTY_SECTION
             
             result = {
                 'phone': phone,
@@ -244,44 +350,20 @@ class WhatsApp:
                 'message_id': message_id
             }
             
-            # Determine message type
-            if 'conversation' in message:
-                result['type'] = 'text'
-                result['text'] = message['conversation']
-                
-            elif 'extendedTextMessage' in message:
-                result['type'] = 'text'
-                result['text'] = message['extendedTextMessage'].get('text')
-                
-            elif 'imageMessage' in message:
-                result['type'] = 'image'
-                result['text'] = message['imageMessage'].get('caption', '')
-                result['media_url'] = message['imageMessage'].get('url')
-                
-            elif 'audioMessage' in message:
-                result['type'] = 'audio'
-                result['media_url'] = message['audioMessage'].get('url')
-                
-            elif 'videoMessage' in message:
-                result['type'] = 'video'
-                result['text'] = message['videoMessage'].get('caption', '')
-                result['media_url'] = message['videoMessage'].get('url')
-                
-            elif 'documentMessage' in message:
-                result['type'] = 'document'
-                result['text'] = message['documentMessage'].get('fileName', '')
-                result['media_url'] = message['documentMessage'].get('url')
-                
-            else:
-                print(f"Warning: Unsupported message type: {list(message.keys())}")
+            # Determine message type (one set intersection; table order breaks ties)
+            kinds = message.keys() & WEBHOOK_MESSAGE_KINDS
+            if not kinds:
+                logger.warning("Unsupported message type: %s", list(message))
                 return None
+            kind = kinds.pop() if len(kinds) == 1 else next(k for k in WEBHOOK_MESSAGE_PARSERS if k in kinds)
+            
+            result['type'], parse = WEBHOOK_MESSAGE_PARSERS[kind]
+            result['text'], result['media_url'] = parse(message[kind])
             
             return result
             
-        except Exception as e:
-            print(f"Webhook parse error: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Webhook parse error")
             return None
 
 